@@ -0,0 +1,145 @@
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from prompt_toolkit.completion import CompleteEvent, FuzzyWordCompleter
+from prompt_toolkit.document import Document
+from santan2ledger.completer import AccountCompleter, AccountTrie
+
+TOP_LEVEL = ["Assets", "Equity", "Expenses", "Income", "Liabilities"]
+
+
+def _word(rng: random.Random) -> str:
+    length = rng.randint(4, 10)
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length)).title()
+
+
+def make_accounts(n_accounts: int, seed: int = 0) -> list[str]:
+    """Return n_accounts made up account names, 2 to 4 segments deep.
+
+    Segments are drawn from a vocabulary that grows with n_accounts, so
+    names share segments like they do in a real accounts.ledger.
+    """
+    rng = random.Random(seed)
+    groups = [_word(rng) for _ in range(max(n_accounts // 800, 10))]
+    leaves = [_word(rng) for _ in range(max(n_accounts // 15, 50))]
+    accounts = set()
+    while len(accounts) < n_accounts:
+        segments = [rng.choice(TOP_LEVEL), rng.choice(groups)]
+        segments += [rng.choice(groups[:20]), rng.choice(leaves)]
+        accounts.add(":".join(segments[: rng.randint(2, 4)]))
+    return sorted(accounts)
+
+
+def _typed(account: str, rng: random.Random) -> list[str]:
+    """Return what is typed, keystroke by keystroke, to find account.
+
+    Either the name itself, an abbreviation of each segment, or part of
+    the last segment only.
+    """
+    segments = account.split(":")
+    style = rng.choice(["full", "abbreviated", "last"])
+    if style == "full":
+        text = account
+    elif style == "abbreviated":
+        text = ":".join(segment[:3].lower() for segment in segments)
+    else:
+        text = segments[-1][1:5].lower()
+    return [text[:i] for i in range(1, len(text) + 1)]
+
+
+def measure_completion(
+    n_accounts: int, n_lookups: int, repeats: int, baseline: bool
+) -> dict:
+    """Time completing accounts as they are typed.
+
+    Parameters
+    ----------
+    n_accounts : int
+        Number of accounts in the completer
+    n_lookups : int
+        Number of accounts typed
+    repeats : int
+        Each keystroke is timed this many times, the best time counts
+    baseline : bool
+        Also time a FuzzyWordCompleter over the same accounts
+
+    Returns
+    -------
+    dict
+        Build time, keystroke latency percentiles in ms and the number of
+        keystrokes, for each completer
+    """
+    rng = random.Random(1)
+    accounts = make_accounts(n_accounts)
+    start = time.perf_counter()
+    trie = AccountTrie()
+    for account in accounts:
+        trie.insert(account, count=int(rng.expovariate(0.3)))
+    build_seconds = time.perf_counter() - start
+
+    keystrokes = [
+        text for _ in range(n_lookups) for text in _typed(rng.choice(accounts), rng)
+    ]
+    completers = {"trie": AccountCompleter(trie)}
+    if baseline:
+        completers["fuzzy_word"] = FuzzyWordCompleter(accounts)
+    result = {"accounts": n_accounts, "keystrokes": len(keystrokes)}
+    result["trie_build_seconds"] = round(build_seconds, 3)
+    for name, completer in completers.items():
+        latencies = []
+        for text in keystrokes:
+            document = Document(text)
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                # Only the first screenful is rendered
+                for i, _ in enumerate(
+                    completer.get_completions(document, CompleteEvent())
+                ):
+                    if i == 50:
+                        break
+                best = min(best, time.perf_counter() - start)
+            latencies.append(best * 1000)
+        latencies.sort()
+        result[name] = {
+            "median_ms": round(latencies[len(latencies) // 2], 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+            "max_ms": round(latencies[-1], 3),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time account completion per keystroke."
+    )
+    parser.add_argument(
+        "--accounts", type=int, default=50000, help="Number of accounts."
+    )
+    parser.add_argument(
+        "--lookups", type=int, default=50, help="Number of accounts typed."
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Timings per keystroke.")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=1.0,
+        help="Maximum allowed p95 keystroke latency, in ms.",
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="Also time FuzzyWordCompleter, slow for many accounts.",
+    )
+    args = parser.parse_args()
+
+    result = measure_completion(
+        args.accounts, args.lookups, args.repeats, args.baseline
+    )
+    result["budget_ms"] = args.budget
+    print(json.dumps(result, indent=2))
+    if result["trie"]["p95_ms"] > args.budget:
+        sys.exit(f"p95 keystroke latency {result['trie']['p95_ms']}ms > budget")
@@ -0,0 +1,190 @@
+import json
+import os
+import random
+from datetime import date, timedelta
+import pandas as pd
+from santan2ledger.history import COLUMNS
+from santan2ledger.xact import Xact
+
+MERCHANTS = [
+    ("CARD PAYMENT TO TFL TRAVEL CH", "Expenses:Spending:Travel", 1.5, 8.0),
+    ("CARD PAYMENT TO TESCO STORES {ref}", "Expenses:Groceries", 3.0, 80.0),
+    ("CARD PAYMENT TO SAINSBURYS S/MKTS", "Expenses:Groceries", 2.0, 60.0),
+    ("CARD PAYMENT TO Amazon Prime*{ref}", "Expenses:Subscriptions", 7.99, 8.99),
+    ("CARD PAYMENT TO PRET A MANGER", "Expenses:Spending:Food", 2.5, 12.0),
+    ("CARD PAYMENT TO DELIVEROO", "Expenses:Spending:Food", 10.0, 40.0),
+    ("CARD PAYMENT TO SPOTIFY", "Expenses:Subscriptions", 9.99, 9.99),
+    ("CARD PAYMENT TO TRAINLINE.COM", "Expenses:Spending:Travel", 5.0, 120.0),
+    ("DIRECT DEBIT PAYMENT TO THAMES WATER REF {ref}", "Expenses:Bills", 30.0, 45.0),
+    ("DIRECT DEBIT PAYMENT TO OCTOPUS ENERGY", "Expenses:Bills", 40.0, 120.0),
+    ("STANDING ORDER VIA FASTER PAYMENT TO LANDLORD", "Expenses:Rent", 950.0, 950.0),
+    ("FASTER PAYMENTS RECEIPT FROM ACME LTD SALARY", "Income:Salary", -2500.0, -2500.0),
+    (
+        "FASTER PAYMENTS RECEIPT FROM MR J SMITH",
+        "Liabilities:Loans:Friends",
+        -50.0,
+        -5.0,
+    ),
+    ("CARD PAYMENT TO UBER *TRIP {ref}", "Expenses:Spending:Travel", 6.0, 35.0),
+    ("CARD PAYMENT TO GYM GROUP", "Expenses:Health", 24.99, 24.99),
+]
+
+SOURCE_ACCOUNT = "Assets:Santander:Main"
+
+
+def _transactions(n_rows: int, seed: int, n_merchants: int) -> list[tuple]:
+    """Return n_rows random (date, description, amount, account), oldest first.
+
+    Besides the fixed MERCHANTS, n_merchants - len(MERCHANTS) made up card
+    merchants are used, so the number of distinct descriptions grows with
+    the history like it does in practice.
+    """
+    rng = random.Random(seed)
+    merchants = MERCHANTS + [
+        (
+            f"CARD PAYMENT TO SHOP {i} {rng.choice(['LONDON', 'LTD', 'UK'])}",
+            f"Expenses:Spending:Shop{i % 40}",
+            1.0,
+            100.0,
+        )
+        for i in range(max(n_merchants - len(MERCHANTS), 0))
+    ]
+    day = date(2015, 1, 1)
+    rows = []
+    for _ in range(n_rows):
+        day += timedelta(days=rng.random() < 0.3)
+        description, account, low, high = rng.choice(merchants)
+        description = description.format(ref=f"{rng.randrange(10**6):06d}")
+        if description.startswith("CARD PAYMENT"):
+            description += f", RATE 1.00/GBP ON {day.strftime('%d-%m-%Y')}"
+        amount = round(rng.uniform(low, high), 2)
+        rows.append((day, description, amount, account))
+    return rows
+
+
+def make_statement_text(n_rows: int, seed: int = 0, n_merchants: int = 200) -> str:
+    """Return a Santander style .txt export with n_rows transactions.
+
+    Like the real exports, values are separated by non breaking spaces,
+    blocks are separated by tab only lines, and transactions are listed
+    newest first after a From:/Account: header.
+    """
+    xacts = _transactions(n_rows, seed, n_merchants)
+    balance = 1000.0
+    blocks = []
+    for day, description, amount, _ in xacts:
+        balance = round(balance - amount, 2)
+        blocks.append(
+            f"Date:\xa0{day.strftime('%d/%m/%Y')}\r\n"
+            f"Description: {description}\xa0\r\n"
+            f"Amount:\xa0{-amount:.2f}\xa0GBP\xa0\r\n"
+            f"Balance:\xa0{balance:.2f}\xa0GBP\xa0\r\n"
+            "\t\t\t\t\t\t\r\n"
+        )
+    first, last = (xacts[0][0], xacts[-1][0]) if xacts else (date.today(),) * 2
+    header = (
+        f"From:\xa0{first.strftime('%d/%m/%Y')}\xa0to\xa0{last.strftime('%d/%m/%Y')}\r\n"
+        "\t\t\t\t\t\t\r\n"
+        "Account:\xa0XXXX XXXX XXXX 1234\r\n"
+        "\t\t\t\t\t\t\r\n"
+    )
+    return header + "".join(reversed(blocks))
+
+
+def write_statement(
+    path: str, n_rows: int, seed: int = 0, encoding: str = "cp1252"
+) -> None:
+    """Write make_statement_text(n_rows) to path, in a non utf-8 encoding."""
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(make_statement_text(n_rows, seed))
+
+
+def make_history(n_rows: int, seed: int = 1, n_merchants: int = 2000) -> pd.DataFrame:
+    """Return a prev_xact DataFrame with n_rows categorised transactions."""
+    return pd.DataFrame.from_records(
+        [
+            (
+                day.isoformat(),
+                " " + description,
+                SOURCE_ACCOUNT,
+                account,
+                -amount,
+                "GBP",
+            )
+            for day, description, amount, account in _transactions(
+                n_rows, seed, n_merchants
+            )
+        ],
+        columns=COLUMNS,
+    )
+
+
+def write_ledger(path: str, n_xacts: int, seed: int = 2, mode: str = "w") -> None:
+    """Write n_xacts categorised transactions to path, as santan2ledger does.
+
+    mode "a" appends them, E.g to time an incremental rescan.
+    """
+    xacts = [
+        Xact(
+            source_account=SOURCE_ACCOUNT,
+            target_account=account,
+            amount=-amount,
+            description=" " + description,
+            date_str=day.isoformat(),
+            commodity="GBP",
+        )
+        for day, description, amount, account in _transactions(n_xacts, seed, 2000)
+    ]
+    with open(path, mode) as f:
+        f.write("\n" + "\n\n".join(xact.to_ledger_str() for xact in xacts))
+
+
+def write_accounts(path: str, n_accounts: int = 200) -> list[str]:
+    """Write an accounts.ledger with n_accounts accounts, return their names."""
+    accounts = sorted({account for _, account, _, _ in MERCHANTS})
+    accounts += [f"Expenses:Generated:Account{i}" for i in range(n_accounts)]
+    with open(path, "w") as f:
+        f.write("; Accounts used by santan2ledger, this account line is a comment\n")
+        f.write("".join(f"account {account}\n" for account in accounts))
+    return accounts
+
+
+def make_ledger_dir(root: str, n_statement_rows: int, n_history_rows: int) -> str:
+    """Create a ledger directory, config and history for a benchmark run.
+
+    Parameters
+    ----------
+    root : str
+        Directory to create everything in
+    n_statement_rows : int
+        Number of transactions in Statements/Statements.txt
+    n_history_rows : int
+        Number of rows in data/prev_xact.pkl
+
+    Returns
+    -------
+    str
+        Path of the config.json to pass to Parser
+    """
+    os.makedirs(os.path.join(root, "Statements"), exist_ok=True)
+    os.makedirs(os.path.join(root, "Ledgers"), exist_ok=True)
+    os.makedirs(os.path.join(root, "data"), exist_ok=True)
+    write_statement(
+        os.path.join(root, "Statements", "Statements.txt"), n_statement_rows
+    )
+    write_accounts(os.path.join(root, "Ledgers", "accounts.ledger"))
+    open(os.path.join(root, "Ledgers", "bench.ledger"), "w").close()
+    make_history(n_history_rows).to_pickle(os.path.join(root, "data", "prev_xact.pkl"))
+    config_path = os.path.join(root, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(
+            {
+                "ledger_dir": root,
+                "main_ledger_file": "Ledgers/bench.ledger",
+                "other_ledger_files": {"bench": "Ledgers/bench.ledger"},
+                "accounts_files": {"bench": "Ledgers/accounts.ledger"},
+            },
+            f,
+            indent=2,
+        )
+    return config_path
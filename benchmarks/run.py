@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from benchmarks.generate import SOURCE_ACCOUNT, make_ledger_dir, write_ledger
+from santan2ledger.history import SqliteHistoryStore
+from santan2ledger.journal import SessionJournal
+from santan2ledger.parser import Parser
+from santan2ledger.rules import RuleSet
+from santan2ledger.selector import Selector
+from santan2ledger.xact import Xact
+
+
+def measure(stage: str, n_items: int, func) -> tuple[dict, object]:
+    """Run func once, return its timings, traced memory and its result.
+
+    The memory still allocated when func returns is reported as retained,
+    E.g the loaded history, along with the peak.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the stage, E.g "parse_statement"
+    n_items : int
+        Number of items (rows, lookups, ...) func processes
+    func : Callable[[], Any]
+        Function running the stage
+
+    Returns
+    -------
+    tuple[dict, Any]
+        (measurements, return value of func)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "stage": stage,
+        "items": n_items,
+        "seconds": seconds,
+        "items_per_second": n_items / seconds if seconds else None,
+        "peak_memory_bytes": peak,
+        "retained_memory_bytes": retained,
+    }, result
+
+
+def run_ledger_sync(n_ledger_xacts: int, n_appended: int = 100) -> list[dict]:
+    """Benchmark seeding the history from a ledger file of n_ledger_xacts."""
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        ledger_path = os.path.join(root, "journal.ledger")
+        write_ledger(ledger_path, n_ledger_xacts)
+        store = SqliteHistoryStore(path=os.path.join(root, "prev_xact.db"))
+        result, _ = measure(
+            "ledger_sync_cold", n_ledger_xacts, lambda: store.sync_ledger(ledger_path)
+        )
+        result["file_bytes"] = os.path.getsize(ledger_path)
+        results.append(result)
+        write_ledger(ledger_path, n_appended, seed=3, mode="a")
+        result, _ = measure(
+            "ledger_sync_append", n_appended, lambda: store.sync_ledger(ledger_path)
+        )
+        results.append(result)
+        result, _ = measure(
+            "ledger_sync_unchanged", 1, lambda: store.sync_ledger(ledger_path)
+        )
+        results.append(result)
+        result, _ = measure(
+            "ledger_history_load",
+            n_ledger_xacts + n_appended,
+            lambda: store.load(SOURCE_ACCOUNT),
+        )
+        results.append(result)
+        store.close()
+    return results
+
+
+def run_size(n_history_rows: int, n_statement_rows: int, n_lookups: int) -> list[dict]:
+    """Benchmark every stage against a history of n_history_rows rows."""
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        config_path = make_ledger_dir(root, n_statement_rows, n_history_rows)
+        data_dir = os.path.join(root, "data")
+        parser = Parser(account_key="bench", config_path=config_path)
+
+        result, statement = measure(
+            "parse_statement",
+            n_statement_rows,
+            lambda: parser.read_table(parser.statements_dir + "Statements.txt"),
+        )
+        results.append(result)
+        # A repeat run loads the statement parsed by the first from the cache
+        cached_parser = Parser(
+            account_key="bench", config_path=config_path, cache_dir=data_dir
+        )
+        cached_parser.read_table(parser.statements_dir + "Statements.txt")
+        result, _ = measure(
+            "parse_statement_cached",
+            n_statement_rows,
+            lambda: Parser(
+                account_key="bench", config_path=config_path, cache_dir=data_dir
+            ).read_table(parser.statements_dir + "Statements.txt"),
+        )
+        results.append(result)
+        result, accounts = measure("get_account_list", 1, parser.get_account_list)
+        results.append(result)
+
+        # Opening the store the first time migrates prev_xact.pkl
+        result, selector = measure(
+            "history_migrate", n_history_rows, lambda: Selector(data_dir=data_dir)
+        )
+        results.append(result)
+        result, _ = measure(
+            "history_load",
+            n_history_rows,
+            lambda: selector.filter_source_account(SOURCE_ACCOUNT),
+        )
+        results.append(result)
+
+        rules = RuleSet.from_config(
+            [
+                {"contains": f"SHOP {i} ", "account": f"Expenses:Spending:Shop{i}"}
+                for i in range(1000)
+            ]
+        )
+        result, _ = measure(
+            "rules_match",
+            len(statement),
+            lambda: [
+                rules.match(record.description, record.amount) for record in statement
+            ],
+        )
+        results.append(result)
+
+        records = list(statement)[:n_lookups]
+        descriptions = [record.description for record in records]
+        result, _ = measure(
+            "match",
+            len(descriptions),
+            lambda: [selector._get_matching_account_name(d) for d in descriptions],
+        )
+        results.append(result)
+        xacts = [
+            Xact(
+                source_account=SOURCE_ACCOUNT,
+                target_account=accounts[i % len(accounts)],
+                amount=record.amount,
+                description=record.description,
+                date_str=record.date.isoformat(),
+                commodity=record.commodity,
+            )
+            for i, record in enumerate(records)
+        ]
+        result, _ = measure(
+            "append_xact_to_prev_df",
+            len(xacts),
+            lambda: [selector.append_xact_to_prev_df(xact) for xact in xacts],
+        )
+        results.append(result)
+        result, _ = measure(
+            "update_prev_xact_file", len(xacts), selector.update_prev_xact_file
+        )
+        results.append(result)
+        selector.close()
+        # Journaled one at a time, each fsync'd, then written to the ledger at once
+        journal = SessionJournal(
+            path=os.path.join(data_dir, "session.journal"), flush_every=0
+        )
+        journal.begin(parser.ledger_file_path, parser.accounts_file_path, accounts)
+        result, _ = measure(
+            "journal_add", len(xacts), lambda: [journal.add(xact) for xact in xacts]
+        )
+        results.append(result)
+        result, _ = measure("journal_flush", len(xacts), journal.flush)
+        results.append(result)
+        journal.close()
+
+    for result in results:
+        result["history_rows"] = n_history_rows
+    return results
+
+
+def git_revision() -> str:
+    """Return the current git commit, or '' outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the santan2ledger hot paths on synthetic data."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 100_000, 1_000_000],
+        help="History sizes (rows) to benchmark.",
+    )
+    parser.add_argument(
+        "--statement-rows",
+        type=int,
+        default=2_000,
+        help="Number of transactions in the synthetic statement.",
+    )
+    parser.add_argument(
+        "--lookups",
+        type=int,
+        default=20,
+        help="Number of transactions matched and appended per size.",
+    )
+    parser.add_argument(
+        "--ledger-xacts",
+        type=int,
+        default=50_000,
+        help="Number of transactions in the ledger file seeding the history.",
+    )
+    parser.add_argument(
+        "-o", "--output", default="", help="Write the JSON report to this file."
+    )
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": [
+            result
+            for size in args.sizes
+            for result in run_size(size, args.statement_rows, args.lookups)
+        ]
+        + run_ledger_sync(args.ledger_xacts),
+    }
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_str + "\n")
+    else:
+        print(report_str)
@@ -0,0 +1,78 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules that must not be imported before the first prompt is shown
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "fuzzywuzzy",
+    "Levenshtein",
+    "chardet",
+    "multiprocessing",
+]
+
+# Imports everything main needs up to the "Source Account" prompt
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import santan2ledger.cli
+import santan2ledger.main
+seconds = time.perf_counter() - start
+print(json.dumps({
+    "seconds": seconds,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def measure_startup(repeats: int) -> dict:
+    """Import the startup path in fresh interpreters, return the best time.
+
+    Parameters
+    ----------
+    repeats : int
+        Number of fresh interpreters to time
+
+    Returns
+    -------
+    dict
+        {"seconds": best import time, "heavy_modules": [...]}
+    """
+    runs = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT % HEAVY_MODULES],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        )
+        for _ in range(repeats)
+    ]
+    return min(runs, key=lambda run: run["seconds"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that starting s2l stays fast and lazy."
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.5,
+        help="Maximum allowed import time of the startup path, in seconds.",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Number of fresh interpreters."
+    )
+    args = parser.parse_args()
+
+    result = measure_startup(args.repeats)
+    result["budget"] = args.budget
+    print(json.dumps(result, indent=2))
+    if result["heavy_modules"]:
+        sys.exit(f"Heavy modules imported at startup: {result['heavy_modules']}")
+    if result["seconds"] > args.budget:
+        sys.exit(f"Startup took {result['seconds']:.3f}s > {args.budget}s budget")
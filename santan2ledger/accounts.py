@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import unicodedata
+from typing import Callable
+from santan2ledger.files import TAIL_SIZE, is_extended, write_atomic
+
+# An account directive, E.g "account Expenses:Food  ; note". Only matches at
+# the start of a line, so comments mentioning "account" are ignored
+ACCOUNT_PATTERN = re.compile(r"^account[ \t]+([^;\r\n]*[^;\s])", re.MULTILINE)
+
+
+class AccountIndex:
+
+    """Accounts declared in an accounts.ledger, kept up to date incrementally.
+
+    The file is fully scanned once. Later refreshes compare its size and
+    mtime, and if it has only grown, E.g because new accounts were appended,
+    only the appended lines are scanned. The result is persisted in a JSON
+    cache, so the same holds across runs. An incomplete last line is only
+    kept as partial until it is complete, as it may still be appended to.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        cache_path: str = "",
+        get_encoding: Callable[[str], str] | None = None,
+    ):
+        """Load the index of file_path from the cache, and bring it up to date.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the accounts.ledger
+        cache_path : str
+            JSON file to persist the index in, not persisted if ''. May be
+            shared by the indexes of several files
+        get_encoding : Callable[[str], str] | None
+            Returns the encoding of a file, E.g Parser._get_encoding,
+            utf-8 is assumed if not given
+        """
+        self._file_path = os.path.abspath(file_path)
+        self._cache_path = cache_path
+        self._get_encoding = get_encoding
+        # Account names in file order, and as a set
+        self.names = []
+        self.accounts = set()
+        # Account declared on the incomplete last line, '' if none
+        self.partial = ""
+        # Bytes scanned so far, always up to the end of a line
+        self._scanned = 0
+        self._tail = ""
+        # (size, mtime_ns) of the file when last refreshed
+        self._stat = (0, 0)
+        self._encoding = ""
+        self._load_cache()
+        self.refresh()
+
+    def _load_cache(self) -> None:
+        if not self._cache_path or not os.path.exists(self._cache_path):
+            return None
+        with open(self._cache_path, "r") as f:
+            entry = json.load(f).get(self._file_path)
+        if entry:
+            self.names = entry["names"]
+            self.accounts = set(self.names)
+            self.partial = entry.get("partial", "")
+            self._scanned = entry["scanned"]
+            self._tail = entry["tail"]
+            self._stat = tuple(entry["stat"])
+            self._encoding = entry["encoding"]
+
+    def _save_cache(self) -> None:
+        if not self._cache_path:
+            return None
+        cache = {}
+        if os.path.exists(self._cache_path):
+            with open(self._cache_path, "r") as f:
+                cache = json.load(f)
+        cache[self._file_path] = {
+            "names": self.names,
+            "partial": self.partial,
+            "scanned": self._scanned,
+            "tail": self._tail,
+            "stat": list(self._stat),
+            "encoding": self._encoding,
+        }
+        write_atomic(self._cache_path, json.dumps(cache).encode())
+
+    def refresh(self) -> None:
+        """Scan what changed in the file since the last refresh, if anything."""
+        stat = os.stat(self._file_path)
+        if (stat.st_size, stat.st_mtime_ns) == self._stat:
+            return None
+        with open(self._file_path, "rb") as f:
+            if not (
+                is_extended(f, stat.st_size, self._scanned, self._tail)
+                and self._is_ascii_compatible()
+            ):
+                self.names = []
+                self.accounts = set()
+                self._scanned = 0
+                self._tail = ""
+                self._encoding = (
+                    self._get_encoding(self._file_path)
+                    if self._get_encoding
+                    else "utf-8"
+                )
+            f.seek(self._scanned)
+            data = f.read()
+        # An incomplete last line is scanned again once it is complete
+        end = data.rfind(b"\n") + 1 if self._is_ascii_compatible() else len(data)
+        for name in self._find_names(data[:end]):
+            if name not in self.accounts:
+                self.accounts.add(name)
+                self.names.append(name)
+        self.partial = next(iter(self._find_names(data[end:])), "")
+        self._scanned += end
+        self._tail = (bytes.fromhex(self._tail) + data[:end])[-TAIL_SIZE:].hex()
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+        self._save_cache()
+
+    def all_names(self) -> list[str]:
+        """Return names, followed by partial if it is a new account."""
+        if self.partial and self.partial not in self.accounts:
+            return self.names + [self.partial]
+        return list(self.names)
+
+    def _find_names(self, data: bytes) -> list[str]:
+        """Return the account names declared in data, in order."""
+        text = unicodedata.normalize("NFKD", data.decode(self._encoding))
+        return ACCOUNT_PATTERN.findall(text)
+
+    def _is_ascii_compatible(self) -> bool:
+        """Whether lines can be split on b"\\n", E.g not for utf-16."""
+        return "a\n".encode(self._encoding).endswith(b"a\n")
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import zlib
+from datetime import datetime
+from santan2ledger.files import hash_file, write_atomic
+
+
+class BackupStore:
+
+    """Content addressed, compressed store of snapshots of the ledger files.
+
+    Every file version is stored once, under the sha256 of its content, in
+    {backup_dir}/objects. Ledger files mostly grow at the end, so a version
+    that extends the previous one is stored as a delta: the hash of the
+    previous version plus the appended bytes. Anything else is stored whole.
+    Both are zlib compressed. Each snapshot is a line of
+    {backup_dir}/snapshots.jsonl mapping file paths to their versions, so an
+    unchanged file costs a stat call, and a touched but unchanged file a
+    hash. One store may back up the files of several accounts, so a file's
+    previous version is looked up in the newest snapshot holding it, and
+    only the newest retention snapshots of each file are kept.
+    """
+
+    def __init__(self, backup_dir: str, retention: int = 30, max_chain: int = 16):
+        """Open (or create) the store in backup_dir.
+
+        Parameters
+        ----------
+        backup_dir : str
+            Directory of the store, E.g "{ledger_dir}/Backups"
+        retention : int
+            Number of snapshots kept of each file, older ones are removed
+        max_chain : int
+            Maximum number of deltas between a version and a whole copy
+        """
+        self._backup_dir = backup_dir
+        self._objects_dir = os.path.join(backup_dir, "objects")
+        self._manifest_path = os.path.join(backup_dir, "snapshots.jsonl")
+        self._retention = retention
+        self._max_chain = max_chain
+        os.makedirs(self._objects_dir, exist_ok=True)
+
+    def snapshots(self) -> list[dict]:
+        """Return all snapshots, oldest first.
+
+        Returns
+        -------
+        list[dict]
+            {"id": int, "time": ISO timestamp, "files": {path: version}},
+            where version is {"hash", "size", "mtime_ns", "chain"}
+        """
+        if not os.path.exists(self._manifest_path):
+            return []
+        with open(self._manifest_path, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _object_path(self, digest: str, kind: str) -> str:
+        return os.path.join(self._objects_dir, f"{digest}.{kind}")
+
+    def _has_object(self, digest: str) -> bool:
+        return any(
+            os.path.exists(self._object_path(digest, kind)) for kind in ("z", "delta")
+        )
+
+    def _chain_length(self, digest: str) -> int:
+        """Return the number of deltas between a stored version and a whole copy."""
+        chain = 0
+        while not os.path.exists(self._object_path(digest, "z")):
+            with open(self._object_path(digest, "delta"), "rb") as f:
+                digest = f.readline().strip().decode()
+            chain += 1
+        return chain
+
+    def _store_version(self, file_path: str, previous: dict | None) -> dict:
+        """Store the current content of file_path, return its version."""
+        stat = os.stat(file_path)
+        base_size = previous["size"] if previous else 0
+        digest, prefix_digest = hash_file(file_path, base_size)
+        version = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chain": 0,
+        }
+        if self._has_object(digest):
+            # E.g the file was restored to an older version, or is unchanged
+            version["chain"] = self._chain_length(digest)
+            return version
+        is_append = (
+            previous is not None
+            and prefix_digest == previous["hash"]
+            and previous["chain"] < self._max_chain
+        )
+        with open(file_path, "rb") as f:
+            if is_append:
+                f.seek(base_size)
+                data = previous["hash"].encode() + b"\n" + zlib.compress(f.read())
+                version["chain"] = previous["chain"] + 1
+                write_atomic(self._object_path(digest, "delta"), data)
+            else:
+                write_atomic(self._object_path(digest, "z"), zlib.compress(f.read()))
+        return version
+
+    def snapshot(self, file_paths: list[str]) -> dict | None:
+        """Back up the files, storing only versions not already stored.
+
+        Nothing is written if every file is as in the newest snapshot
+        holding it.
+
+        Parameters
+        ----------
+        file_paths : list[str]
+            Files to back up, E.g the ledger and accounts files
+
+        Returns
+        -------
+        dict | None
+            The new snapshot, see snapshots(), None if no file changed
+        """
+        snapshots = self.snapshots()
+        files = {}
+        changed = False
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            previous = next(
+                (
+                    snapshot["files"][file_path]
+                    for snapshot in reversed(snapshots)
+                    if file_path in snapshot["files"]
+                ),
+                None,
+            )
+            stat = os.stat(file_path)
+            if previous and (previous["size"], previous["mtime_ns"]) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+            ):
+                files[file_path] = previous
+            else:
+                files[file_path] = self._store_version(file_path, previous)
+                changed = changed or not (
+                    previous and previous["hash"] == files[file_path]["hash"]
+                )
+        if not changed:
+            return None
+        snapshot = {
+            "id": snapshots[-1]["id"] + 1 if snapshots else 1,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "files": files,
+        }
+        with open(self._manifest_path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        snapshots.append(snapshot)
+        # Newest first, count the snapshots kept of each file
+        kept_counts = {}
+        kept = []
+        for older in reversed(snapshots):
+            keep = False
+            for file_path in older["files"]:
+                if kept_counts.get(file_path, 0) < self._retention:
+                    kept_counts[file_path] = kept_counts.get(file_path, 0) + 1
+                    keep = True
+            if keep:
+                kept.append(older)
+        if len(kept) < len(snapshots):
+            self._prune(kept[::-1])
+        return snapshot
+
+    def _prune(self, kept: list[dict]) -> None:
+        """Keep only the kept snapshots, and the objects they need."""
+        write_atomic(
+            self._manifest_path,
+            "".join(json.dumps(snapshot) + "\n" for snapshot in kept).encode(),
+        )
+        needed = set()
+        to_visit = [
+            version["hash"]
+            for snapshot in kept
+            for version in snapshot["files"].values()
+        ]
+        while to_visit:
+            digest = to_visit.pop()
+            if digest in needed:
+                continue
+            needed.add(digest)
+            delta_path = self._object_path(digest, "delta")
+            if os.path.exists(delta_path):
+                with open(delta_path, "rb") as f:
+                    to_visit.append(f.readline().strip().decode())
+        for name in os.listdir(self._objects_dir):
+            if name.split(".")[0] not in needed:
+                os.remove(os.path.join(self._objects_dir, name))
+
+    def read(self, digest: str) -> bytes:
+        """Return the content of the stored version with the given hash."""
+        deltas = []
+        while not os.path.exists(self._object_path(digest, "z")):
+            with open(self._object_path(digest, "delta"), "rb") as f:
+                digest = f.readline().strip().decode()
+                deltas.append(zlib.decompress(f.read()))
+        with open(self._object_path(digest, "z"), "rb") as f:
+            content = zlib.decompress(f.read())
+        return content + b"".join(reversed(deltas))
+
+    def restore(self, snapshot_id: int, target_dir: str = "") -> list[str]:
+        """Restore the files of a snapshot.
+
+        The current files are snapshotted first, so a restore can be undone.
+
+        Parameters
+        ----------
+        snapshot_id : int
+            Id of the snapshot to restore, see snapshots()
+        target_dir : str
+            If given, write the files into this directory instead of
+            overwriting them in place
+
+        Returns
+        -------
+        list[str]
+            Paths of the restored files
+        """
+        snapshot = next((s for s in self.snapshots() if s["id"] == snapshot_id), None)
+        if snapshot is None:
+            raise ValueError(f"No backup snapshot with id {snapshot_id}")
+        # Read first, the snapshot below may prune the one being restored
+        contents = {
+            file_path: self.read(version["hash"])
+            for file_path, version in snapshot["files"].items()
+        }
+        if not target_dir:
+            self.snapshot([path for path in contents if os.path.exists(path)])
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        restored = []
+        for file_path, content in contents.items():
+            if target_dir:
+                file_path = os.path.join(target_dir, os.path.basename(file_path))
+            write_atomic(file_path, content)
+            restored.append(file_path)
+        return restored
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point of the s2l-backup console script, to list and restore backups.
+
+    Parameters
+    ----------
+    argv : list[str] | None
+        Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(
+        prog="s2l-backup", description="List or restore ledger file backups."
+    )
+    parser.add_argument(
+        "--config",
+        dest="config_path",
+        default=os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json"
+        ),
+        help="Path to config.json, defaults to the one next to the package.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the backup snapshots.")
+    restore_parser = subparsers.add_parser(
+        "restore", help="Restore the files of a snapshot."
+    )
+    restore_parser.add_argument("snapshot_id", type=int, help="Id from 'list'.")
+    restore_parser.add_argument(
+        "--to",
+        dest="target_dir",
+        default="",
+        help="Write the files into this directory instead of in place.",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config_path, "r") as f:
+        config = json.load(f)
+    store = BackupStore(
+        os.path.join(config["ledger_dir"], "Backups"),
+        retention=config.get("backup_retention", 30),
+    )
+    if args.command == "list":
+        for snapshot in store.snapshots():
+            print(f"{snapshot['id']:>5}  {snapshot['time']}")
+            for file_path, version in snapshot["files"].items():
+                print(
+                    f"       {version['hash'][:12]}  {version['size']:>10}  {file_path}"
+                )
+    else:
+        for file_path in store.restore(args.snapshot_id, args.target_dir):
+            print(f"Restored {file_path}")
+
+
+if __name__ == "__main__":
+    main()
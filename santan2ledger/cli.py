@@ -0,0 +1,155 @@
+import argparse
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Return the command line argument parser of s2l."""
+    parser = argparse.ArgumentParser(
+        prog="s2l",
+        description="Categorise Santander statement exports into ledger files.",
+    )
+
+    parser.add_argument(
+        "statements_file_name",
+        help="Santander exported txt file to parse, or a glob pattern such as"
+        " '*.txt' to parse and merge all matching files in the Statements dir.",
+    )
+    parser.add_argument(
+        "-d",
+        "--date-after",
+        dest="date_after",
+        help="Date to start parsing transactions after.",
+    )
+    parser.add_argument(
+        "account_key",
+        nargs="?",
+        default="",
+        help="Key corresponding to account for ledger and accounts files from config.json",
+    )
+    parser.add_argument(
+        "--all-accounts",
+        dest="all_accounts",
+        action="store_true",
+        help="Categorise every account in config.json in one run, sharing the"
+        " history. statements_file_name must contain '{account_key}'.",
+    )
+    parser.add_argument(
+        "-s",
+        "--source-account",
+        dest="source_account",
+        default="",
+        help="Source account, instead of prompting for it.",
+    )
+    parser.add_argument(
+        "-c",
+        "--commodity",
+        dest="default_commodity",
+        default="",
+        help="Default commodity, instead of prompting for it.",
+    )
+    parser.add_argument(
+        "--auto",
+        action="store_true",
+        help="Assign suggested accounts without prompting when confident enough.",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        default=90,
+        help="Minimum match score (0-100) for --auto to accept a suggestion."
+        " The description similarity alone must reach it too.",
+    )
+    parser.add_argument(
+        "-r",
+        "--review-file",
+        dest="review_file",
+        default="",
+        help="With --auto, write unmatched transactions to this csv file"
+        " instead of prompting for them.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print time and memory spent per stage at exit.",
+    )
+    parser.add_argument(
+        "--profile-json",
+        dest="profile_json",
+        default="",
+        help="With --profile, also write a JSON trace to this file.",
+    )
+    parser.add_argument(
+        "--config",
+        dest="config_path",
+        default="",
+        help="Path to config.json, defaults to the one next to the package.",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point of the s2l console script.
+
+    Arguments are parsed before anything heavy is imported, so --help and
+    argument errors are instant and the first prompt appears as early as
+    possible.
+
+    Parameters
+    ----------
+    argv : list[str] | None
+        Command line arguments, defaults to sys.argv[1:]
+    """
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if args.all_accounts:
+        if args.account_key or args.source_account:
+            arg_parser.error(
+                "--all-accounts takes no account_key or --source-account,"
+                " set 'source_accounts' in config.json instead"
+            )
+        if "{account_key}" not in args.statements_file_name:
+            arg_parser.error(
+                "with --all-accounts, statements_file_name must contain '{account_key}'"
+            )
+    elif not args.account_key:
+        arg_parser.error("the following arguments are required: account_key")
+
+    from santan2ledger import main as s2l
+    from santan2ledger.profiling import profiler
+
+    if args.profile:
+        profiler.enable()
+    config_path = args.config_path or s2l.ROOT_PATH + "/config.json"
+    try:
+        if args.all_accounts:
+            s2l.main_all_accounts(
+                statement_file_name=args.statements_file_name,
+                date_after=args.date_after,
+                default_commodity=args.default_commodity,
+                auto=args.auto,
+                threshold=args.threshold,
+                review_file=args.review_file,
+                config_path=config_path,
+            )
+            return None
+        s2l.main(
+            statement_file_name=args.statements_file_name,
+            account_key=args.account_key,
+            date_after=args.date_after,
+            source_account=args.source_account,
+            default_commodity=args.default_commodity,
+            auto=args.auto,
+            threshold=args.threshold,
+            review_file=args.review_file,
+            config_path=config_path,
+        )
+    finally:
+        if args.profile:
+            profiler.disable()
+            print(profiler.summary())
+            if args.profile_json:
+                profiler.dump(args.profile_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from array import array
+from datetime import date
+
+# Amounts are stored as integer multiples of 1 / AMOUNT_SCALE, i.e. pence
+AMOUNT_SCALE = 100
+
+
+def to_fixed(amount: float) -> int:
+    """Return amount as a fixed point integer, E.g -20.79 -> -2079."""
+    return round(amount * AMOUNT_SCALE)
+
+
+def from_fixed(amount: int) -> float:
+    """Return the float value of a fixed point amount, E.g -2079 -> -20.79."""
+    return amount / AMOUNT_SCALE
+
+
+def to_ordinal(date_str: str) -> int:
+    """Return the proleptic Gregorian ordinal of an ISO date string."""
+    return date.fromisoformat(date_str).toordinal()
+
+
+def from_ordinal(ordinal: int) -> str:
+    """Return the ISO date string of a proleptic Gregorian ordinal."""
+    return date.fromordinal(ordinal).isoformat()
+
+
+class Dictionary:
+
+    """Interns strings as consecutive integer codes, for dictionary encoding.
+
+    Columns of repeated strings, such as account names, are stored as an
+    array of codes, so each distinct string is only held in memory once.
+    Codes are never reused, so removing rows from a column never
+    invalidates the codes of the others.
+    """
+
+    __slots__ = ("_codes", "values")
+
+    def __init__(self):
+        self._codes = {}
+        # Code -> string
+        self.values = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        """Return the code of value, assigning the next free one if it is new."""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> str:
+        """Return the string with the given code."""
+        return self.values[code]
+
+
+class StringHeap:
+
+    """Append-only strings packed into one utf-8 buffer.
+
+    For columns of mostly distinct strings, such as descriptions that
+    include a date, where a Dictionary would hold every string as a Python
+    object plus a hash table entry. Here each string only takes its utf-8
+    bytes and a 4 byte end offset, and is decoded when read.
+    """
+
+    __slots__ = ("_data", "_ends")
+
+    def __init__(self):
+        self._data = bytearray()
+        # End offset of every string in self._data
+        self._ends = array("I")
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self._ends)
+        start = self._ends[i - 1] if i else 0
+        return self._data[start : self._ends[i]].decode()
+
+    def append(self, value: str) -> None:
+        """Add value after the last string."""
+        self._data += value.encode()
+        self._ends.append(len(self._data))
+
+    def pop(self) -> None:
+        """Remove the last string, if any."""
+        if self._ends:
+            self._ends.pop()
+            del self._data[self._ends[-1] if self._ends else 0 :]
+
+    def tail(self, n: int) -> StringHeap:
+        """Return a new heap of the last n strings."""
+        heap = StringHeap()
+        start = max(len(self) - n, 0)
+        offset = self._ends[start - 1] if start else 0
+        heap._data = self._data[offset:]
+        heap._ends = array("I", (end - offset for end in self._ends[start:]))
+        return heap
@@ -0,0 +1,542 @@
+import bisect
+import heapq
+import itertools
+import re
+from typing import Iterable, Iterator
+from prompt_toolkit.completion import CompleteEvent, Completer, Completion
+from prompt_toolkit.document import Document
+
+# Ranks of a query segment matching an account segment
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+# Kinds of entries of the search heap of AccountTrie.complete, in the order
+# they are taken when otherwise equal
+ACCOUNT, SUBTREE, STREAM = 0, 1, 2
+
+# Fuzzy matched query segments remembered, see AccountTrie._fuzzy_segments
+FUZZY_CACHE_SIZE = 256
+
+# Matched subtrees with fewer nodes than this are searched directly, rather
+# than through the segment index
+SUBTREE_SEARCH_SIZE = 2048
+
+
+def _fuzzy_pattern(query: str) -> re.Pattern:
+    """Return a pattern matching lines containing query as a subsequence."""
+    return re.compile(
+        "^[^\\n]*?" + "[^\\n]*?".join(map(re.escape, query)) + "[^\\n]*$",
+        re.MULTILINE,
+    )
+
+
+def _rank(query: str, segment: str, fuzzy: bool) -> int:
+    """Return how well segment matches query, 0 if it does not."""
+    if segment.startswith(query):
+        return EXACT if segment == query else PREFIX
+    if fuzzy and len(query) > 1:
+        chars = iter(segment)
+        if all(char in chars for char in query):
+            return FUZZY
+    return 0
+
+
+class _Node:
+
+    """Node of AccountTrie, one segment of an account name."""
+
+    __slots__ = (
+        "name",
+        "key",
+        "parent",
+        "children",
+        "ordered",
+        "count",
+        "max_count",
+        "size",
+    )
+
+    def __init__(self, name: str, key: str, parent: "_Node | None"):
+        # Full name up to this segment, E.g "Expenses:Spending", and the
+        # segment lower cased, E.g "spending"
+        self.name = name
+        self.key = key
+        self.parent = parent
+        self.children = {}
+        # Children most used first, None until sorted again
+        self.ordered = None
+        # Times the account was used, None if the node is not an account itself
+        self.count = None
+        # Highest count in the subtree, so it can be searched best first
+        self.max_count = -1
+        # Number of nodes in the subtree, itself included
+        self.size = 1
+
+
+class AccountTrie:
+
+    """Account names in a trie of their ":" separated segments.
+
+    Expenses:Spending:Food is stored as Expenses -> Spending -> Food. Every
+    distinct segment (lower cased) is also indexed with the nodes it occurs
+    at, so a query is matched against the distinct segments rather than
+    every account, and only the subtrees of the matched nodes are visited,
+    most used accounts first, until enough completions are found.
+    """
+
+    def __init__(self, accounts: Iterable[str] = ()):
+        """Create the trie.
+
+        Parameters
+        ----------
+        accounts : Iterable[str]
+            Accounts to insert, E.g Parser.get_account_list()
+        """
+        self._root = _Node("", "", None)
+        self._accounts = {}
+        # Lower cased segment => nodes with that segment, and the segments sorted
+        self._nodes = {}
+        self._segments = []
+        # Segments whose nodes need sorting again, see _sorted_nodes
+        self._unsorted = set()
+        # Character => segments containing it, the fuzzy matches of 1 character
+        self._segments_with = {}
+        self._fuzzy_cache = {}
+        # (parts, nodes below them, last part, its matches), see
+        # _match_last_below
+        self._below_cache = (None, [], "", [])
+        for account in accounts:
+            self.insert(account)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __contains__(self, account: str) -> bool:
+        return account in self._accounts
+
+    def insert(self, account: str, count: int = 0) -> None:
+        """Add account if new, and count more uses of it.
+
+        Parameters
+        ----------
+        account : str
+            Account name, E.g "Expenses:Spending:Food"
+        count : int
+            Number of uses to add, more used accounts are completed first
+        """
+        node = self._accounts.get(account)
+        if node is None:
+            path = [self._root]
+            for segment in account.split(":"):
+                child = path[-1].children.get(segment)
+                if child is None:
+                    child = self._add_node(path[-1], segment)
+                    for ancestor in path:
+                        ancestor.size += 1
+                path.append(child)
+            node = path[-1]
+            node.count = 0
+            self._accounts[account] = node
+        node.count += count
+        # Counts only grow, so the maxima only need raising along the path
+        new_count = node.count
+        while node is not None and node.max_count < new_count:
+            node.max_count = new_count
+            self._unsorted.add(node.key)
+            if node.parent is not None:
+                node.parent.ordered = None
+            node = node.parent
+
+    def _add_node(self, parent: _Node, segment: str) -> _Node:
+        """Create the child node of parent for segment, and index it."""
+        name = f"{parent.name}:{segment}" if parent.name else segment
+        key = segment.lower()
+        child = _Node(name, key, parent)
+        parent.children[segment] = child
+        parent.ordered = None
+        if key not in self._nodes:
+            self._nodes[key] = []
+            bisect.insort(self._segments, key)
+            for char in set(key):
+                self._segments_with.setdefault(char, []).append(key)
+            self._fuzzy_cache.clear()
+        self._nodes[key].append(child)
+        self._unsorted.add(key)
+        self._below_cache = (None, [], "", [])
+        return child
+
+    def _ordered_children(self, node: _Node) -> list[_Node]:
+        """Return the children of node, most used first."""
+        if node.ordered is None:
+            node.ordered = sorted(
+                node.children.values(), key=lambda child: (-child.max_count, child.name)
+            )
+        return node.ordered
+
+    def _sorted_nodes(self, segment: str) -> list[_Node]:
+        """Return the nodes of segment, top level and most used first."""
+        nodes = self._nodes[segment]
+        if segment in self._unsorted:
+            self._unsorted.discard(segment)
+            nodes.sort(
+                key=lambda node: (
+                    node.parent is not self._root,
+                    -node.max_count,
+                    node.name,
+                )
+            )
+        return nodes
+
+    def count(self, account: str) -> int:
+        """Return the number of uses of account, 0 if unknown."""
+        node = self._accounts.get(account)
+        return node.count if node is not None else 0
+
+    def _prefix_segments(self, query: str) -> list[tuple[str, int]]:
+        """Return the distinct segments starting with query, with their rank."""
+        start = bisect.bisect_left(self._segments, query)
+        end = bisect.bisect_left(self._segments, query + "\uffff", start)
+        return [
+            (segment, EXACT if segment == query else PREFIX)
+            for segment in self._segments[start:end]
+        ]
+
+    def _fuzzy_segments(self, query: str) -> list[str]:
+        """Return the distinct segments containing query as a subsequence.
+
+        The matches of a query are among those of the query minus its last
+        character, so while typing only the previous matches are checked.
+        """
+        matches = self._fuzzy_cache.get(query)
+        if matches is None:
+            if len(query) == 1:
+                return self._segments_with.get(query, [])
+            candidates = self._fuzzy_segments(query[:-1])
+            # Segments never contain newlines, so check them all in one go
+            matches = _fuzzy_pattern(query).findall("\n".join(candidates))
+            if len(self._fuzzy_cache) >= FUZZY_CACHE_SIZE:
+                self._fuzzy_cache.clear()
+            self._fuzzy_cache[query] = matches
+        return matches
+
+    def _match_indexed(
+        self, part: str, matched: dict[_Node, int] | None, fuzzy: bool
+    ) -> dict[_Node, int]:
+        """Return the nodes matching part below the matched nodes, by index."""
+        if fuzzy:
+            segments = [(segment, FUZZY) for segment in self._fuzzy_segments(part)]
+        else:
+            segments = self._prefix_segments(part)
+        ranked = {}
+        for segment, rank in segments:
+            for node in self._nodes[segment]:
+                if matched is None:
+                    # Each node has a single segment, so is only ranked once
+                    ranked[node] = rank + (node.parent is self._root)
+                    continue
+                ancestor = node.parent
+                while ancestor is not None:
+                    if ancestor in matched:
+                        ranked[node] = (
+                            matched[ancestor] + rank + (ancestor is node.parent)
+                        )
+                        break
+                    ancestor = ancestor.parent
+        return ranked
+
+    def _match_below(
+        self, part: str, matched: dict[_Node, int], fuzzy: bool
+    ) -> dict[_Node, int]:
+        """Return the nodes matching part below the matched nodes, by search."""
+        ranked = {}
+        # (node, its nearest matched ancestor)
+        stack = [(child, node) for node in matched for child in node.children.values()]
+        while stack:
+            node, ancestor = stack.pop()
+            rank = _rank(part, node.key, fuzzy)
+            if rank:
+                ranked[node] = matched[ancestor] + rank + (ancestor is node.parent)
+            if node in matched:
+                ancestor = node
+            stack.extend((child, ancestor) for child in node.children.values())
+        return ranked
+
+    def _match(self, parts: list[str]) -> dict[_Node, int]:
+        """Return the nodes matching the ":" separated parts of a query.
+
+        Each part matches a segment below the node matched by the previous
+        part. Directly below ranks higher, so "ex:sp" prefers
+        Expenses:Spending to Expenses:Bills:Sports. The first part may match
+        at any depth, but ranks higher at the top level. A part that starts
+        no segment matches the segments containing its characters in order
+        (fuzzily) instead, E.g "fd" matches Food.
+
+        Returns
+        -------
+        dict[_Node, int]
+            Matched node => rank, higher is better
+        """
+        matched = None
+        for part in parts:
+            if not part:
+                # Nothing typed for this segment, E.g "Expenses::Food"
+                parents = matched if matched is not None else {self._root: 0}
+                ranked = {}
+                for parent, rank in parents.items():
+                    for child in parent.children.values():
+                        ranked[child] = max(ranked.get(child, 0), rank + PREFIX + 1)
+            else:
+                match = self._match_indexed
+                if matched is not None and self._is_small(matched):
+                    match = self._match_below
+                ranked = match(part, matched, fuzzy=False)
+                # A single character is in too many segments to match fuzzily
+                if not ranked and len(part) > 1:
+                    ranked = match(part, matched, fuzzy=True)
+            matched = ranked
+            if not matched:
+                break
+        return matched
+
+    @staticmethod
+    def _is_small(matched: dict[_Node, int]) -> bool:
+        """Whether the subtrees of matched are small enough to search directly."""
+        return sum(node.size for node in matched) < SUBTREE_SEARCH_SIZE
+
+    def _segments_matching(self, part: str) -> list[tuple[str, int]]:
+        """Return the distinct segments matching part, fuzzily if none start with it."""
+        segments = self._prefix_segments(part)
+        if not segments and len(part) > 1:
+            segments = [(segment, FUZZY) for segment in self._fuzzy_segments(part)]
+        return segments
+
+    def complete(self, query: str, limit: int = 50) -> list[str]:
+        """Return the best completions of query, at most limit of them.
+
+        The accounts below the best matching nodes come first, then the most
+        used ones, then alphabetically. The trie is searched best first, and
+        the nodes matching the last part of query are taken in order as
+        needed, so only as much is visited as limit accounts require.
+
+        Parameters
+        ----------
+        query : str
+            Text typed so far, E.g "exp:foo" or "ex:sp:fd" for
+            Expenses:Spending:Food
+        limit : int
+            Maximum number of completions
+
+        Returns
+        -------
+        list[str]
+            Account names, best first
+        """
+        *parts, last = query.lower().split(":")
+        matched = self._match(parts) if parts else None
+        if matched is not None and not matched:
+            return []
+        # Entries sort by (rank, uses, name), and names sort depth first. The
+        # sequence number only avoids comparing nodes, which can be pushed
+        # twice when matched twice.
+        sequence = itertools.count()
+        if not last:
+            parents = matched if matched is not None else {self._root: 0}
+            entries = (
+                self._stream_entry(
+                    self._ordered_children(parent), 0, rank + PREFIX + 1, sequence
+                )
+                for parent, rank in parents.items()
+                if parent.children
+            )
+        elif matched is not None and self._is_small(matched):
+            entries = (
+                (-rank, -node.max_count, node.name, SUBTREE, next(sequence), node)
+                for node, rank in self._match_last_below(parts, matched, last)
+            )
+        elif matched is None:
+            entries = (
+                self._stream_entry(
+                    self._sorted_nodes(segment), 0, rank, sequence, top_bonus=True
+                )
+                for segment, rank in self._segments_matching(last)
+            )
+        else:
+            bound = max(matched.values()) + 1
+            entries = (
+                self._stream_entry(
+                    self._sorted_nodes(segment), 0, rank, sequence, matched, bound
+                )
+                for segment, rank in self._segments_matching(last)
+            )
+        heap = [entry for entry in entries if entry is not None]
+        heapq.heapify(heap)
+
+        completions = []
+        seen = set()
+        while heap and len(completions) < limit:
+            rank, _, name, kind, _, item = heapq.heappop(heap)
+            if kind == ACCOUNT:
+                # First reached under its best matching node
+                if name not in seen:
+                    seen.add(name)
+                    completions.append(name)
+            elif kind == STREAM:
+                nodes, i, stream_rank, top_bonus, scope, bound, ancestor_rank = item
+                node = nodes[i]
+                if scope is not None:
+                    # The entry ranked at the bound, the node by its ancestor
+                    rank = -(stream_rank + ancestor_rank)
+                heapq.heappush(
+                    heap, (rank, -node.max_count, name, SUBTREE, next(sequence), node)
+                )
+                entry = self._stream_entry(
+                    nodes, i + 1, stream_rank, sequence, scope, bound, top_bonus
+                )
+                if entry is not None:
+                    heapq.heappush(heap, entry)
+            elif item not in seen:
+                seen.add(item)
+                if item.count is not None:
+                    heapq.heappush(
+                        heap, (rank, -item.count, name, ACCOUNT, next(sequence), item)
+                    )
+                if item.children:
+                    # Taken one at a time, most used first
+                    heapq.heappush(
+                        heap,
+                        self._stream_entry(
+                            self._ordered_children(item), 0, -rank, sequence
+                        ),
+                    )
+        return completions
+
+    def _match_last_below(
+        self, parts: list[str], matched: dict[_Node, int], last: str
+    ) -> list[tuple[_Node, int]]:
+        """Return the nodes below the nodes matched by parts matching last.
+
+        The nodes below, and the prefix matches of last, are kept for the
+        next query, so typing more of last only filters the previous matches.
+        """
+        cached_parts, below, cached_last, cached_matches = self._below_cache
+        if cached_parts != parts:
+            below = []
+            # (node, its nearest matched ancestor)
+            stack = [
+                (child, node) for node in matched for child in node.children.values()
+            ]
+            while stack:
+                node, ancestor = stack.pop()
+                below.append((node, matched[ancestor] + (ancestor is node.parent)))
+                if node in matched:
+                    ancestor = node
+                stack.extend((child, ancestor) for child in node.children.values())
+            cached_last = ""
+        candidates = below
+        if cached_last and last.startswith(cached_last):
+            candidates = cached_matches
+        matches = [
+            (node, rank) for node, rank in candidates if node.key.startswith(last)
+        ]
+        self._below_cache = (parts, below, last, matches)
+        if matches:
+            return [
+                (node, rank + (EXACT if node.key == last else PREFIX))
+                for node, rank in matches
+            ]
+        if len(last) > 1:
+            return [
+                (node, rank + FUZZY)
+                for node, rank in below
+                if _rank(last, node.key, fuzzy=True)
+            ]
+        return []
+
+    @staticmethod
+    def _ancestor_rank(node: _Node, matched: dict[_Node, int]) -> int:
+        """Return the rank of the nearest matched ancestor of node, 0 if none.
+
+        Directly below the ancestor ranks 1 higher.
+        """
+        ancestor = node.parent
+        while ancestor is not None:
+            if ancestor in matched:
+                return matched[ancestor] + (ancestor is node.parent)
+            ancestor = ancestor.parent
+        return 0
+
+    def _stream_entry(
+        self,
+        nodes: list[_Node],
+        i: int,
+        rank: int,
+        sequence: Iterator[int],
+        scope: dict[_Node, int] | None = None,
+        bound: int = 0,
+        top_bonus: bool = False,
+    ) -> tuple | None:
+        """Return the heap entry of nodes[i:], the rest follow as it is taken.
+
+        nodes must be in the order of their entries, E.g as sorted by
+        _ordered_children or _sorted_nodes. The nodes rank rank, 1 higher at
+        the top level if top_bonus. If scope is given, only nodes below the
+        matched nodes in scope are taken, ranking rank plus their ancestor's,
+        and the entry ranks at their upper bound rank + bound.
+
+        Returns
+        -------
+        tuple | None
+            The entry, None if there are no (more) nodes to take
+        """
+        ancestor_rank = 0
+        if scope is not None:
+            # Skipped without going through the heap
+            while i < len(nodes):
+                ancestor_rank = self._ancestor_rank(nodes[i], scope)
+                if ancestor_rank:
+                    break
+                i += 1
+        if i == len(nodes):
+            return None
+        node = nodes[i]
+        if scope is not None:
+            entry_rank = rank + bound
+        else:
+            entry_rank = rank + (top_bonus and node.parent is self._root)
+        return (
+            -entry_rank,
+            -node.max_count,
+            node.name,
+            STREAM,
+            next(sequence),
+            (nodes, i, rank, top_bonus, scope, bound, ancestor_rank),
+        )
+
+
+class AccountCompleter(Completer):
+
+    """prompt_toolkit completer over an AccountTrie, kept for the whole session."""
+
+    def __init__(self, trie: AccountTrie | None = None, limit: int = 50):
+        """Create the completer.
+
+        Parameters
+        ----------
+        trie : AccountTrie | None
+            Accounts to complete, new accounts may be inserted at any time
+        limit : int
+            Maximum number of completions shown
+        """
+        self.trie = trie if trie is not None else AccountTrie()
+        self._limit = limit
+
+    def get_completions(
+        self, document: Document, complete_event: CompleteEvent
+    ) -> Iterator[Completion]:
+        text = document.text_before_cursor
+        for account in self.trie.complete(text.strip(), self._limit):
+            uses = self.trie.count(account)
+            yield Completion(
+                account,
+                start_position=-len(text),
+                display_meta=f"{uses}x" if uses else "",
+            )
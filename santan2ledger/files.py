@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+# Bytes read at a time while hashing
+CHUNK_SIZE = 1 << 20
+
+# Bytes before the scanned end of a file checked to still be the same
+TAIL_SIZE = 64
+
+
+def is_extended(f, size: int, scanned: int, tail: str) -> bool:
+    """Whether the first scanned bytes of a file are unchanged.
+
+    Only the TAIL_SIZE bytes before scanned are compared, which catches
+    the usual edits to a file that is otherwise only appended to.
+
+    Parameters
+    ----------
+    f : BinaryIO
+        The file, opened in binary mode
+    size : int
+        Current size of the file
+    scanned : int
+        Number of bytes scanned before
+    tail : str
+        Hex of the TAIL_SIZE bytes before scanned when they were scanned
+    """
+    if not scanned or size < scanned:
+        return False
+    f.seek(max(scanned - TAIL_SIZE, 0))
+    return f.read(min(scanned, TAIL_SIZE)).hex() == tail
+
+
+def hash_file(file_path: str, prefix_size: int = -1) -> tuple[str, str]:
+    """Return the sha256 of the file, and of its first prefix_size bytes.
+
+    The prefix hash is '' if prefix_size < 0 or the file is shorter.
+    """
+    digest = hashlib.sha256()
+    prefix_digest = hashlib.sha256() if prefix_size == 0 else None
+    position = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            if prefix_digest is None and 0 <= prefix_size <= position + len(chunk):
+                digest.update(chunk[: prefix_size - position])
+                prefix_digest = digest.copy()
+                digest.update(chunk[prefix_size - position :])
+            else:
+                digest.update(chunk)
+            position += len(chunk)
+    return digest.hexdigest(), prefix_digest.hexdigest() if prefix_digest else ""
+
+
+def write_atomic(file_path: str, data: bytes) -> None:
+    """Write data to file_path via a temporary file, so it is never partial.
+
+    The data is fsync'd before the temporary file replaces file_path.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
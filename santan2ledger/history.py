@@ -0,0 +1,450 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+from array import array
+from typing import TYPE_CHECKING, Iterable
+from santan2ledger.columns import (
+    Dictionary,
+    StringHeap,
+    from_fixed,
+    from_ordinal,
+    to_fixed,
+    to_ordinal,
+)
+from santan2ledger.ledger import scan_ledger, xact_to_row as ledger_xact_to_row
+from santan2ledger.xact import Xact
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+COLUMNS = [
+    "date_str",
+    "description",
+    "source_account",
+    "target_account",
+    "amount",
+    "commodity",
+]
+
+# Columns of HistoryTable stored as codes of its string Dictionary
+STRING_COLUMNS = ["source_account", "target_account", "commodity"]
+
+
+class HistoryTable:
+
+    """Previously categorised transactions held in compact typed columns.
+
+    Dates are stored as ordinals and amounts as fixed point integers (see
+    santan2ledger.columns). Accounts and commodities are dictionary
+    encoded, so each distinct string is held once however many transactions
+    share it. Descriptions are nearly all distinct, as they include the
+    date, so they are packed into a StringHeap instead. append and pop are
+    amortised O(1).
+    """
+
+    __slots__ = ("dates", "amounts", "descriptions", "_strings", "_codes")
+
+    def __init__(self, strings: Dictionary | None = None):
+        """Create an empty table.
+
+        Parameters
+        ----------
+        strings : Dictionary | None
+            Dictionary encoding the string columns, shared by tail()
+        """
+        self.dates = array("i")
+        self.amounts = array("q")
+        self.descriptions = StringHeap()
+        self._strings = Dictionary() if strings is None else strings
+        # Column name -> codes of its values in self._strings
+        self._codes = {column: array("I") for column in STRING_COLUMNS}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> HistoryTable:
+        """Build a table from rows of values in COLUMNS order."""
+        table = cls()
+        for row in rows:
+            table.append_row(row)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def append_row(self, row: tuple) -> None:
+        """Add a row of values in COLUMNS order to the end of the table."""
+        date_str, description, source_account, target_account, amount, commodity = row
+        self.dates.append(to_ordinal(date_str))
+        self.amounts.append(to_fixed(amount))
+        self.descriptions.append(description)
+        encode = self._strings.encode
+        self._codes["source_account"].append(encode(source_account))
+        self._codes["target_account"].append(encode(target_account))
+        self._codes["commodity"].append(encode(commodity))
+
+    def append(self, xact: Xact) -> None:
+        """Add xact to the end of the table."""
+        row = xact_to_row(xact)
+        self.append_row(tuple(row[column] for column in COLUMNS))
+
+    def pop(self) -> None:
+        """Remove the last row of the table, if any."""
+        if self.dates:
+            self.dates.pop()
+            self.amounts.pop()
+            self.descriptions.pop()
+            for codes in self._codes.values():
+                codes.pop()
+
+    def row(self, i: int) -> tuple:
+        """Return the values of row i in COLUMNS order."""
+        return tuple(self._value(column, i) for column in COLUMNS)
+
+    def _value(self, column: str, i: int) -> str | float:
+        if column == "date_str":
+            return from_ordinal(self.dates[i])
+        if column == "amount":
+            return from_fixed(self.amounts[i])
+        if column == "description":
+            return self.descriptions[i]
+        return self._strings.decode(self._codes[column][i])
+
+    def column(self, column: str) -> list:
+        """Return the decoded values of column, E.g "target_account".
+
+        Parameters
+        ----------
+        column : str
+            One of COLUMNS
+
+        Returns
+        -------
+        list
+            Strings, or floats for "amount", oldest row first
+        """
+        if column == "date_str":
+            return [from_ordinal(ordinal) for ordinal in self.dates]
+        if column == "amount":
+            return [from_fixed(amount) for amount in self.amounts]
+        if column == "description":
+            return [self.descriptions[i] for i in range(len(self))]
+        return [self._strings.decode(code) for code in self._codes[column]]
+
+    def tail(self, n: int = 5) -> HistoryTable:
+        """Return a new table of the last n rows."""
+        table = HistoryTable(self._strings)
+        start = max(len(self) - n, 0)
+        table.dates = self.dates[start:]
+        table.amounts = self.amounts[start:]
+        table.descriptions = self.descriptions.tail(n)
+        table._codes = {column: codes[start:] for column, codes in self._codes.items()}
+        return table
+
+    def to_df(self) -> pd.DataFrame:
+        """Return the table as a DataFrame with columns COLUMNS. Requires pandas."""
+        import pandas as pd
+
+        return pd.DataFrame({column: self.column(column) for column in COLUMNS})
+
+    def __str__(self) -> str:
+        """Format the table as aligned text columns, E.g to print the tail."""
+        max_width = 40
+        rows = [COLUMNS] + [
+            [
+                f"{value:.2f}" if column == "amount" else value.strip()
+                for column, value in zip(COLUMNS, self.row(i))
+            ]
+            for i in range(len(self))
+        ]
+        widths = [
+            min(max(len(row[j]) for row in rows), max_width)
+            for j in range(len(COLUMNS))
+        ]
+        return "\n".join(
+            "  ".join(
+                value[:width].rjust(width)
+                if column == "amount"
+                else value[:width].ljust(width)
+                for column, value, width in zip(COLUMNS, row, widths)
+            ).rstrip()
+            for row in rows
+        )
+
+
+class HistoryStore:
+
+    """Base class for stores of previously categorised transactions.
+
+    Rows appended or popped during a session are only made permanent by
+    commit(). Anything not committed is discarded when the store is closed.
+    """
+
+    def load(self, source_account: str = "") -> HistoryTable:
+        """Return the stored transactions, oldest first.
+
+        Parameters
+        ----------
+        source_account : str
+            If given, only return transactions from this account
+
+        Returns
+        -------
+        HistoryTable
+            The transactions, in compact columns
+        """
+        raise NotImplementedError
+
+    def imported(self, source_account: str) -> tuple[set[str], str]:
+        """Return what has already been imported from source_account.
+
+        Parameters
+        ----------
+        source_account : str
+            E.g "Assets:Santander:Spending"
+
+        Returns
+        -------
+        tuple[set[str], str]
+            Statement fingerprints of the imported transactions, and the last
+            date_str of transactions imported before fingerprints were
+            recorded ('' if there are none)
+        """
+        raise NotImplementedError
+
+    def append(self, xact: Xact, fingerprint: str = "") -> None:
+        """Add xact, and the fingerprint of its statement row, to the history."""
+        raise NotImplementedError
+
+    def pop(self) -> None:
+        """Remove the last transaction appended during this session, if any."""
+        raise NotImplementedError
+
+    def commit(self) -> None:
+        """Make the changes of this session permanent."""
+        raise NotImplementedError
+
+    def sync_ledger(self, file_path: str) -> int:
+        """Bring the transactions read from a ledger file up to date.
+
+        They are returned by load along with the categorised transactions,
+        so existing journals seed the history. Stores that can't hold them
+        ignore the file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of a utf-8 .ledger file
+
+        Returns
+        -------
+        int
+            Number of transactions (re)read from the file
+        """
+        return 0
+
+    def close(self) -> None:
+        """Release the store, discarding uncommitted changes."""
+
+
+class SqliteHistoryStore(HistoryStore):
+
+    """History kept in an indexed SQLite database, changed one row at a time."""
+
+    def __init__(self, path: str, pickle_path: str = ""):
+        """Open (or create) the database at path.
+
+        If the database is new and pickle_path exists, the pickled history is
+        migrated into it once.
+
+        Parameters
+        ----------
+        path : str
+            Path of the database file, E.g "data/prev_xact.db"
+        pickle_path : str
+            Path of a legacy prev_xact.pkl to migrate from
+        """
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS xacts (
+                id INTEGER PRIMARY KEY,
+                date_str TEXT NOT NULL,
+                description TEXT NOT NULL,
+                source_account TEXT NOT NULL,
+                target_account TEXT NOT NULL,
+                amount REAL NOT NULL,
+                commodity TEXT NOT NULL,
+                fingerprint TEXT
+            );
+            CREATE INDEX IF NOT EXISTS xacts_source_account
+                ON xacts (source_account, id);
+            CREATE INDEX IF NOT EXISTS xacts_date ON xacts (date_str);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS ledger_xacts (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                byte_offset INTEGER NOT NULL,
+                date_str TEXT NOT NULL,
+                description TEXT NOT NULL,
+                source_account TEXT NOT NULL,
+                target_account TEXT NOT NULL,
+                amount REAL NOT NULL,
+                commodity TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ledger_xacts_file
+                ON ledger_xacts (file_path, byte_offset);
+            CREATE INDEX IF NOT EXISTS ledger_xacts_source_account
+                ON ledger_xacts (source_account, date_str);
+            -- LedgerScan.state of the last scan of each ledger file
+            CREATE TABLE IF NOT EXISTS ledger_files (
+                file_path TEXT PRIMARY KEY,
+                state TEXT NOT NULL
+            );
+            """
+        )
+        # Databases created before fingerprints were recorded lack the column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(xacts)")]
+        if "fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE xacts ADD COLUMN fingerprint TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS xacts_fingerprint"
+            " ON xacts (source_account, fingerprint)"
+        )
+        self._conn.commit()
+        # Ids of the rows inserted this session, so pop() can only undo those
+        self._session_ids = []
+        if pickle_path and os.path.exists(pickle_path):
+            self._migrate(pickle_path)
+
+    def _migrate(self, pickle_path: str) -> None:
+        """Copy the pickled history into the database, unless already done."""
+        if self._conn.execute(
+            "SELECT 1 FROM meta WHERE key = 'migrated_from'"
+        ).fetchone():
+            return None
+        # Reading the pickle needs pandas, but only this once
+        import pandas as pd
+
+        df = pd.read_pickle(pickle_path)
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO xacts ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                df[COLUMNS].itertuples(index=False, name=None),
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (pickle_path,),
+            )
+
+    def load(self, source_account: str = "") -> HistoryTable:
+        where, params = "", ()
+        if source_account:
+            where, params = " WHERE source_account = ?", (source_account,)
+        # Transactions read from ledger files come first, except those also
+        # categorised here, which are usually the ones this tool wrote
+        ledger_query = (
+            f"SELECT {', '.join(COLUMNS)} FROM ledger_xacts AS l"
+            + (where or " WHERE 1")
+            + """ AND NOT EXISTS (
+                SELECT 1 FROM xacts AS x
+                WHERE x.date_str = l.date_str
+                    AND x.source_account = l.source_account
+                    AND x.target_account = l.target_account
+                    AND round(x.amount, 2) = round(l.amount, 2)
+                    AND trim(x.description) = l.description
+            ) ORDER BY date_str, id"""
+        )
+        table = HistoryTable.from_rows(self._conn.execute(ledger_query, params))
+        for row in self._conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM xacts{where} ORDER BY id", params
+        ):
+            table.append_row(row)
+        return table
+
+    def imported(self, source_account: str) -> tuple[set[str], str]:
+        fingerprints = {
+            fingerprint
+            for (fingerprint,) in self._conn.execute(
+                "SELECT fingerprint FROM xacts"
+                " WHERE source_account = ? AND fingerprint IS NOT NULL",
+                (source_account,),
+            )
+        }
+        (legacy_date,) = self._conn.execute(
+            "SELECT max(date_str) FROM xacts"
+            " WHERE source_account = ? AND fingerprint IS NULL",
+            (source_account,),
+        ).fetchone()
+        return fingerprints, legacy_date or ""
+
+    def append(self, xact: Xact, fingerprint: str = "") -> None:
+        row = xact_to_row(xact)
+        cursor = self._conn.execute(
+            f"INSERT INTO xacts ({', '.join(COLUMNS)}, fingerprint)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [row[column] for column in COLUMNS] + [fingerprint or None],
+        )
+        self._session_ids.append(cursor.lastrowid)
+
+    def pop(self) -> None:
+        if self._session_ids:
+            self._conn.execute(
+                "DELETE FROM xacts WHERE id = ?", (self._session_ids.pop(),)
+            )
+
+    def commit(self) -> None:
+        self._conn.commit()
+        self._session_ids = []
+
+    def sync_ledger(self, file_path: str) -> int:
+        """Bring the transactions read from a ledger file up to date.
+
+        Only the bytes appended since the last sync are parsed, see
+        scan_ledger. Commits, so it must be called before transactions
+        are appended this session.
+        """
+        if self._session_ids:
+            raise RuntimeError("Can't sync a ledger file with uncommitted changes")
+        file_path = os.path.abspath(file_path)
+        row = self._conn.execute(
+            "SELECT state FROM ledger_files WHERE file_path = ?", (file_path,)
+        ).fetchone()
+        scan = scan_ledger(file_path, json.loads(row[0]) if row else None)
+        if scan is None:
+            return 0
+        rows = [
+            (file_path, xact.offset) + history_row
+            for xact in scan.xacts
+            if (history_row := ledger_xact_to_row(xact))
+        ]
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM ledger_xacts WHERE file_path = ? AND byte_offset >= ?",
+                (file_path, scan.start),
+            )
+            self._conn.executemany(
+                "INSERT INTO ledger_xacts"
+                f" (file_path, byte_offset, {', '.join(COLUMNS)})"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ledger_files (file_path, state) VALUES (?, ?)",
+                (file_path, json.dumps(scan.state)),
+            )
+        return len(scan.xacts)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def xact_to_row(xact: Xact) -> dict:
+    """Return the history row of xact as a dict keyed by COLUMNS."""
+    return {
+        "date_str": xact.date_str,
+        "description": xact.description,
+        "source_account": xact.source_account,
+        "target_account": xact.target_account,
+        "amount": xact.amount,
+        "commodity": xact.commodity,
+    }
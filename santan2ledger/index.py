@@ -0,0 +1,244 @@
+import heapq
+import re
+from array import array
+from fuzzywuzzy import fuzz  # fuzz.ratio(s1, s2)
+from santan2ledger.columns import Dictionary
+from santan2ledger.scoring import AccountStats, Scorer
+
+
+def clean_text(text: str) -> str:
+    """Simplify the text and return cleaned string.
+
+    Remove all non-alpha chars, common filler words and lowercase.
+
+    Parameters
+    ----------
+    text : str
+        Text to clean
+
+    Returns
+    -------
+    str
+        Cleaned string
+    """
+    text = re.sub(r"[^a-zA-Z\s]", "", text.lower())
+    text = re.sub(r"(gbp|card|payment|samsung|on)", r"", text)
+    return text
+
+
+class DescriptionIndex:
+
+    """Index of cleaned previous transaction descriptions used for matching."""
+
+    def __init__(
+        self,
+        descriptions: list[str] = [],
+        target_accounts: list[str] = [],
+        amounts: list[float] = [],
+        scorer: Scorer | None = None,
+        n_candidates: int = 5,
+    ):
+        """Build the index from the previous transaction descriptions.
+
+        Every description is cleaned exactly once here. Identical cleaned
+        descriptions (merchants) share a single entry with
+        per-account statistics, so each lookup only has to score the unique
+        descriptions. Rows only hold codes of the cleaned descriptions and
+        accounts, so the index grows by a few bytes per row.
+
+        Parameters
+        ----------
+        descriptions : list[str]
+            Raw descriptions of the previous transactions, oldest first
+        target_accounts : list[str]
+            Target account of each previous transaction
+        amounts : list[float]
+            Amount of each previous transaction, 0.0 for all if not given
+        scorer : Scorer | None
+            Combines the description similarity with the statistics
+        n_candidates : int
+            Number of most similar descriptions kept per query for scoring
+        """
+        self._scorer = Scorer() if scorer is None else scorer
+        self._n_candidates = n_candidates
+        # Cleaned descriptions and target accounts of the rows, interned
+        self._cleaned = Dictionary()
+        self._accounts = Dictionary()
+        # Codes of the cleaned description and target account, and the
+        # amount, of every history row
+        self._row_descs = array("I")
+        self._row_accounts = array("I")
+        self._row_amounts = array("d")
+        # Cleaned description -> target account -> AccountStats
+        self._stats = {}
+        # Cleaned query -> [(fuzz ratio, cleaned description), ...] of its most
+        # similar descriptions, best first, see precompute()
+        self._matches = {}
+        if not amounts:
+            amounts = [0.0] * len(descriptions)
+        for description, target_account, amount in zip(
+            descriptions, target_accounts, amounts
+        ):
+            self.append(description, target_account, amount)
+
+    def __len__(self) -> int:
+        return len(self._row_descs)
+
+    def append(
+        self, description: str, target_account: str, amount: float = 0.0
+    ) -> None:
+        """Add a single history row to the end of the index.
+
+        Parameters
+        ----------
+        description : str
+            Raw transaction description
+        target_account : str
+            Account the transaction was assigned to
+        amount : float
+            Transaction amount
+        """
+        code = self._cleaned.encode(clean_text(description))
+        account_code = self._accounts.encode(target_account)
+        # The interned strings, so the stats don't hold copies per row
+        cleaned = self._cleaned.decode(code)
+        target_account = self._accounts.decode(account_code)
+        is_new = cleaned not in self._stats
+        row = len(self._row_descs)
+        self._row_descs.append(code)
+        self._row_accounts.append(account_code)
+        self._row_amounts.append(amount)
+        accounts = self._stats.setdefault(cleaned, {})
+        accounts.setdefault(target_account, AccountStats()).add(row, amount)
+        if is_new:
+            # A new description may enter the candidates of cached queries
+            for query, candidates in self._matches.items():
+                self._insert_candidate(candidates, fuzz.ratio(cleaned, query), cleaned)
+
+    def pop(self) -> list[str]:
+        """Remove the most recently appended history row, if any.
+
+        Returns
+        -------
+        list[str]
+            Cleaned queries whose cached candidates included a description
+            that no longer exists. They are dropped from the cache and
+            rescored on next lookup, or ahead of time with rescore().
+        """
+        if not self._row_descs:
+            return []
+        cleaned = self._cleaned.decode(self._row_descs.pop())
+        target_account = self._accounts.decode(self._row_accounts.pop())
+        amount = self._row_amounts.pop()
+        accounts = self._stats[cleaned]
+        accounts[target_account].remove_last(amount)
+        if not accounts[target_account].count:
+            del accounts[target_account]
+        if accounts:
+            return []
+        del self._stats[cleaned]
+        stale = [
+            query
+            for query, candidates in self._matches.items()
+            if any(desc == cleaned for _, desc in candidates)
+        ]
+        for query in stale:
+            del self._matches[query]
+        return stale
+
+    def best_match(
+        self, desc_to_match: str, amount: float | None = None
+    ) -> tuple[str, int]:
+        """Return the best account for a transaction and its 0-100 score.
+
+        The most similar previous descriptions are found with fuzz.ratio.
+        Each account they were assigned to is then ranked by the Scorer,
+        which also takes amount, frequency and recency into account.
+
+        Parameters
+        ----------
+        desc_to_match : str
+            Raw transaction description to find a match for
+        amount : float | None
+            Transaction amount, if known
+
+        Returns
+        -------
+        tuple[str, int]
+            (target account, score). ('', 0) if the index is empty.
+        """
+        return self._lookup(clean_text(desc_to_match), amount)
+
+    def _lookup(self, cleaned_query: str, amount: float | None) -> tuple[str, int]:
+        """Return (target account, score) for an already cleaned query."""
+        if cleaned_query not in self._matches:
+            self._matches[cleaned_query] = self._candidates(cleaned_query)
+        best_account, best_score = "", 0.0
+        for ratio, cleaned in self._matches[cleaned_query]:
+            accounts = self._stats[cleaned]
+            merchant_count = sum(stats.count for stats in accounts.values())
+            for account, stats in accounts.items():
+                score = self._scorer.score(
+                    ratio, stats, merchant_count, amount, len(self)
+                )
+                if score > best_score:
+                    best_account, best_score = account, score
+        return best_account, round(best_score)
+
+    def rescore(self, cleaned_queries: list[str]) -> None:
+        """Find candidates for already cleaned queries, E.g those from pop()."""
+        for query in cleaned_queries:
+            if query not in self._matches:
+                self._matches[query] = self._candidates(query)
+
+    def _candidates(self, cleaned_query: str) -> list[tuple[int, str]]:
+        """Return the n_candidates most similar descriptions, best first."""
+        return heapq.nlargest(
+            self._n_candidates,
+            ((fuzz.ratio(cleaned, cleaned_query), cleaned) for cleaned in self._stats),
+        )
+
+    def _insert_candidate(
+        self, candidates: list[tuple[int, str]], ratio: int, cleaned: str
+    ) -> None:
+        """Insert (ratio, cleaned) into a best first candidate list if it ranks."""
+        if len(candidates) < self._n_candidates or (ratio, cleaned) > candidates[-1]:
+            candidates.append((ratio, cleaned))
+            candidates.sort(reverse=True)
+            del candidates[self._n_candidates :]
+
+    def precompute(
+        self,
+        descriptions: list[str],
+        amounts: list[float] | None = None,
+    ) -> list[tuple[str, int]]:
+        """Match a whole batch of descriptions against the history at once.
+
+        Each unique cleaned description of the batch is scored against the
+        unique cleaned history descriptions only once. Like every match, the
+        candidates are cached and kept up to date by append() and pop(), so
+        later calls to best_match() for these descriptions only rank a
+        handful of accounts.
+
+        Parameters
+        ----------
+        descriptions : list[str]
+            Raw transaction descriptions, E.g a statement's Description column
+        amounts : list[float] | None
+            Amount of each transaction, if known
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            (target account, score) for each description, in order.
+            ('', 0) for every description if the index is empty.
+        """
+        cleaned_queries = [clean_text(desc) for desc in descriptions]
+        self.rescore(list(dict.fromkeys(cleaned_queries)))
+
+        if amounts is None:
+            amounts = [None] * len(cleaned_queries)
+        return [
+            self._lookup(query, amount)
+            for query, amount in zip(cleaned_queries, amounts)
+        ]
@@ -0,0 +1,108 @@
+import glob
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from santan2ledger.parser import Parser, StatementRecord, StatementTable
+
+
+def find_statements(statements_dir: str, pattern: str = "*.txt") -> list[str]:
+    """Return the paths of all statement files in statements_dir matching pattern.
+
+    Parameters
+    ----------
+    statements_dir : str
+        Directory holding the Santander exports, E.g Parser.statements_dir
+    pattern : str
+        Glob pattern relative to statements_dir, E.g "Statements*.txt"
+
+    Returns
+    -------
+    list[str]
+        Sorted list of matching file paths
+    """
+    return sorted(
+        path
+        for path in glob.glob(os.path.join(statements_dir, pattern))
+        if os.path.isfile(path)
+    )
+
+
+def merge_statements(
+    statements: list[list[StatementRecord]],
+) -> list[StatementRecord]:
+    """Merge several statements into one date ordered list without duplicates.
+
+    Exports with overlapping date windows contain the same transactions.
+    Those are recognised by their date, description, amount and running
+    balance, and only kept once. Records of the same day are ordered by
+    (statement, position in it), so the result only depends on the order
+    of statements.
+
+    Parameters
+    ----------
+    statements : list[list[StatementRecord]]
+        Records of each statement, newest first as exported by Santander
+
+    Returns
+    -------
+    list[StatementRecord]
+        Unique records, earliest first
+    """
+    # Each export is reversed to earliest first. Rows of the same day are
+    # ordered by statement, then by row, so they are never interleaved
+    merged = heapq.merge(
+        *[
+            [
+                ((record.date, source, row), record)
+                for row, record in enumerate(reversed(records))
+            ]
+            for source, records in enumerate(statements)
+        ]
+    )
+    seen = set()
+    unique = []
+    for _, record in merged:
+        if record not in seen:
+            seen.add(record)
+            unique.append(record)
+    return unique
+
+
+def ingest_statements(
+    parser: Parser, pattern: str = "*.txt", max_workers: int | None = None
+) -> list[StatementRecord]:
+    """Parse all matching statement files in parallel and merge them.
+
+    Every file is parsed in its own process, so the total time is bounded by
+    the slowest file rather than the sum. Files found in the parser's
+    statement_cache aren't parsed again.
+
+    Parameters
+    ----------
+    parser : Parser
+        Parser for the account, whose statements_dir is searched
+    pattern : str
+        Glob pattern relative to parser.statements_dir
+    max_workers : int | None
+        Maximum number of processes, defaults to the number of CPUs
+
+    Returns
+    -------
+    list[StatementRecord]
+        Unique records of all files, earliest first
+    """
+    file_paths = find_statements(parser.statements_dir, pattern)
+    # Files parsed before are loaded from the cache, only the rest are parsed
+    cache = parser.statement_cache
+    tables = {path: cache.get(path) if cache else None for path in file_paths}
+    missing = [path for path, table in tables.items() if table is None]
+    if len(missing) <= 1:
+        parsed = [parser.read_statement(path) for path in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(parser.read_statement, missing))
+    for path, records in zip(missing, parsed):
+        tables[path] = StatementTable.from_records(records)
+        if cache is not None:
+            cache.put(path, tables[path])
+    return merge_statements([list(tables[path]) for path in file_paths])
@@ -0,0 +1,276 @@
+import json
+import os
+from santan2ledger.history import xact_to_row
+from santan2ledger.xact import Xact
+
+# Prompt inputs that are never declared as accounts
+IGNORED_ACCOUNTS = {"", "k", "p"}
+
+
+def write_at(file_path: str, offset: int, text: str) -> int:
+    """Truncate the file at file_path to offset bytes, then append text.
+
+    The data is fsync'd before returning, so it survives a crash.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of an existing file
+    offset : int
+        Size to truncate the file to before writing, E.g its current size
+    text : str
+        Text to write at offset
+
+    Returns
+    -------
+    int
+        The new size of the file
+    """
+    data = memoryview(text.encode())
+    fd = os.open(file_path, os.O_WRONLY)
+    try:
+        os.ftruncate(fd, offset)
+        os.lseek(fd, offset, os.SEEK_SET)
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return offset + len(data)
+
+
+def _xact_text(xact: Xact) -> str:
+    """Return xact as written to the ledger, after a blank line."""
+    return "\n" + xact.to_ledger_str() + "\n"
+
+
+def _account_text(account: str) -> str:
+    """Return account as declared in accounts.ledger."""
+    return "account " + account + "\n"
+
+
+class SessionJournal:
+
+    """Write-ahead journal of the transactions accepted during a session.
+
+    Every accepted (or undone) transaction is appended to the journal file
+    and fsync'd before anything else happens. The ledger and accounts files
+    are then brought up to date in batches of flush_every transactions, by
+    appending only what changed since the last flush. An undo of an already
+    flushed transaction truncates the ledger back to where it started on
+    the next flush, so nothing is ever rewritten in full.
+
+    The journal file only exists while a session is running. If it is found
+    when starting, the previous session was interrupted, and recover()
+    rewrites its transactions after the point where it began.
+    """
+
+    def __init__(self, path: str, flush_every: int = 10):
+        """Create a journal kept at path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the journal file, E.g "data/session.journal"
+        flush_every : int
+            Number of accepted transactions written to the ledger at a time,
+            0 to only write them on flush()
+        """
+        self._path = path
+        self._flush_every = flush_every
+        self._file = None
+        # (Xact, statement fingerprint) of every transaction of the session
+        self._xacts = []
+        # Ledger file size after each of the first len(self._ends) transactions
+        self._ends = []
+        self._ledger_file_path = ""
+        self._accounts_file_path = ""
+        self._ledger_size = 0
+        self._accounts_size = 0
+        self._accounts = set()
+
+    def __len__(self) -> int:
+        return len(self._xacts)
+
+    def _write(self, record: dict) -> None:
+        """Append record to the journal and fsync it."""
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def begin(
+        self, ledger_file_path: str, accounts_file_path: str, accounts: list[str]
+    ) -> None:
+        """Start journaling a session that writes to the given files.
+
+        Parameters
+        ----------
+        ledger_file_path : str
+            Ledger file the transactions are appended to
+        accounts_file_path : str
+            accounts.ledger new accounts are declared in
+        accounts : list[str]
+            Accounts already declared in accounts_file_path
+        """
+        if os.path.exists(self._path):
+            raise RuntimeError(
+                f"{self._path} exists, recover() the interrupted session first"
+            )
+        self._ledger_file_path = ledger_file_path
+        self._accounts_file_path = accounts_file_path
+        self._ledger_size = os.path.getsize(ledger_file_path)
+        self._accounts_size = os.path.getsize(accounts_file_path)
+        self._accounts = set(accounts)
+        self._file = open(self._path, "w")
+        self._write(
+            {
+                "op": "begin",
+                "ledger_file_path": ledger_file_path,
+                "accounts_file_path": accounts_file_path,
+                "ledger_size": self._ledger_size,
+                "accounts_size": self._accounts_size,
+                "accounts": sorted(self._accounts),
+            }
+        )
+        # Make sure the journal file itself survives a crash
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def add(self, xact: Xact, fingerprint: str = "") -> None:
+        """Journal an accepted transaction, flushing every flush_every of them.
+
+        Parameters
+        ----------
+        xact : Xact
+            Transaction with its target account set
+        fingerprint : str
+            Fingerprint of the statement row xact came from
+        """
+        self._write({"op": "add", "xact": xact_to_row(xact), "fingerprint": fingerprint})
+        self._xacts.append((xact, fingerprint))
+        unflushed = len(self._xacts) - len(self._ends)
+        if self._flush_every and unflushed >= self._flush_every:
+            self.flush()
+
+    def pop(self) -> None:
+        """Journal the undo of the last accepted transaction, if any."""
+        if self._xacts:
+            self._write({"op": "pop"})
+            self._xacts.pop()
+            # A flushed transaction is truncated away by the next flush
+            del self._ends[len(self._xacts) :]
+
+    def flush(self) -> None:
+        """Write the transactions accepted since the last flush to the files.
+
+        New accounts are only ever appended. Both files are fsync'd.
+        """
+        if self._file is None:
+            return None
+        start = self._ends[-1] if self._ends else self._ledger_size
+        new_xacts = [xact for xact, _ in self._xacts[len(self._ends) :]]
+        # The ledger is longer than expected if flushed transactions were undone
+        if new_xacts or os.path.getsize(self._ledger_file_path) != start:
+            texts = [_xact_text(xact) for xact in new_xacts]
+            write_at(self._ledger_file_path, start, "".join(texts))
+            for text in texts:
+                start += len(text.encode())
+                self._ends.append(start)
+        new_accounts = [
+            account
+            for account in dict.fromkeys(xact.target_account for xact in new_xacts)
+            if account not in self._accounts and account not in IGNORED_ACCOUNTS
+        ]
+        if new_accounts:
+            write_at(
+                self._accounts_file_path,
+                os.path.getsize(self._accounts_file_path),
+                "".join(_account_text(account) for account in new_accounts),
+            )
+            self._accounts.update(new_accounts)
+
+    def close(self) -> None:
+        """End the session, after flush() and committing the history."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._path)
+
+    def discard(self) -> None:
+        """End the session, removing everything it wrote to the files."""
+        if self._file is not None:
+            write_at(self._ledger_file_path, self._ledger_size, "")
+            write_at(self._accounts_file_path, self._accounts_size, "")
+            self._xacts = []
+            self._ends = []
+            self.close()
+
+    def recover(self) -> list[tuple[Xact, str]]:
+        """Finish writing the files of an interrupted session, if there is one.
+
+        The journal is replayed, everything the session wrote to the ledger
+        and accounts files is truncated away, and its transactions and new
+        accounts are written again, so a half finished flush is repaired.
+        The journal is then removed. The files must not have been edited
+        since the session was interrupted.
+
+        Returns
+        -------
+        list[tuple[Xact, str]]
+            (transaction, statement fingerprint) of the recovered session, so
+            they can be added to the history. [] if there was nothing to do.
+        """
+        if not os.path.exists(self._path):
+            return []
+        with open(self._path, "r") as f:
+            lines = f.read().splitlines()
+        records = []
+        for i, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Only the last record can be cut short by a crash
+                if i != len(lines) - 1:
+                    raise
+        if not records or records[0]["op"] != "begin":
+            os.remove(self._path)
+            return []
+
+        begin = records[0]
+        xacts = []
+        for record in records[1:]:
+            if record["op"] == "add":
+                xacts.append((Xact(**record["xact"]), record["fingerprint"]))
+            elif record["op"] == "pop" and xacts:
+                xacts.pop()
+        for file_path, size in (
+            (begin["ledger_file_path"], begin["ledger_size"]),
+            (begin["accounts_file_path"], begin["accounts_size"]),
+        ):
+            if os.path.getsize(file_path) < size:
+                raise RuntimeError(
+                    f"{file_path} shrank since the interrupted session began,"
+                    f" not recovering {self._path}"
+                )
+
+        write_at(
+            begin["ledger_file_path"],
+            begin["ledger_size"],
+            "".join(_xact_text(xact) for xact, _ in xacts),
+        )
+        accounts = set(begin["accounts"])
+        write_at(
+            begin["accounts_file_path"],
+            begin["accounts_size"],
+            "".join(
+                _account_text(account)
+                for account in dict.fromkeys(xact.target_account for xact, _ in xacts)
+                if account not in accounts and account not in IGNORED_ACCOUNTS
+            ),
+        )
+        os.remove(self._path)
+        return xacts
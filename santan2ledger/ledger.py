@@ -0,0 +1,274 @@
+import mmap
+import os
+import re
+import unicodedata
+from datetime import date
+from typing import Iterator, NamedTuple
+from santan2ledger.files import TAIL_SIZE, is_extended
+
+# A transaction as written by Xact.to_ledger_str, an ISO date and payee
+# followed by a posting with a plain amount and one with an elided amount.
+# Most transactions look like this, so they are parsed by this pattern alone
+SIMPLE_XACT = (
+    rb"(\d{4}-\d\d-\d\d)[ \t]+(?:\*[ \t]*)?([^\n;]*)\n"
+    rb"[ \t]+([^\s;*!][^\s;]*(?: [^\s;]+)*)(?:\t|  )[ \t]*"
+    rb"(-?\d+(?:\.\d+)?)[ \t]+([A-Za-z]+)[ \t]*\n"
+    rb"[ \t]+([^\s;*!][^\s;]*(?: [^\s;]+)*)[ \t]*(?=\n(?![ \t])|\Z)"
+)
+
+# Any other transaction: a line starting with a date, followed by its
+# indented posting lines. Directives, comments and automated or periodic
+# transactions start with another character and are skipped
+BLOCK_PATTERN = re.compile(
+    rb"^(?:" + SIMPLE_XACT + rb"|(?:\xef\xbb\xbf)?\d[^\n]*(?:\n[ \t][^\n]*)*)",
+    re.MULTILINE,
+)
+
+# "2022-08-05[=aux date] [*|!] [(code)] payee[  ; note]"
+HEADER_PATTERN = re.compile(
+    r"(\d[\d/.-]*)(?:=\S*)?[ \t]*(?:[*!][ \t]*)?(?:\([^)]*\)[ \t]*)?(.*?)"
+    r"[ \t]*(?:(?:\t|  );.*)?$"
+)
+
+# "  [*|!] Account:Name  [amount][  ; note]", the account is separated from
+# the amount by a tab or at least two spaces
+POSTING_PATTERN = re.compile(
+    r"^[ \t]+(?:[*!][ \t]*)?([^\s;](?:[^\t;]*?[^\s;])??)"
+    r"(?:(?:\t|  )[ \t]*([^;\n]*?))?[ \t]*(?:;[^\n]*)?$",
+    re.MULTILINE,
+)
+
+# Number of an amount, E.g "-1,234.56", with its optional commodity around it
+NUMBER_PATTERN = re.compile(r"-?[ \t]*(?:\d[\d,]*(?:\.\d*)?|\.\d+)")
+
+# Where the amount of a posting ends: a cost, lot price or balance assertion
+AMOUNT_END_PATTERN = re.compile(r"[@={(]")
+
+
+class LedgerPosting(NamedTuple):
+
+    """One posting of a ledger transaction."""
+
+    account: str
+    # None if the amount is elided, i.e. balances the other postings
+    amount: float | None
+    commodity: str
+
+
+class LedgerXact(NamedTuple):
+
+    """A transaction read from a ledger file."""
+
+    # Byte offset of the transaction in the file
+    offset: int
+    # ISO date string
+    date_str: str
+    payee: str
+    postings: list[LedgerPosting]
+
+
+class LedgerScan(NamedTuple):
+
+    """Result of scan_ledger."""
+
+    # Transactions starting at or after start, in file order
+    xacts: list[LedgerXact]
+    # Byte offset the scan restarted at, transactions of an earlier scan at
+    # or after it are replaced by xacts
+    start: int
+    # Pass to the next scan_ledger of the same file
+    state: dict
+
+
+def parse_date(date_str: str) -> str:
+    """Return the ISO date of a ledger date, '' if it has no year.
+
+    Accepts "2022-08-05", "2022/8/5" and the legacy "05-08-2022".
+    """
+    parts = re.split(r"[/.-]", date_str)
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return ""
+    if len(parts[0]) == 4:
+        year, month, day = parts
+    elif len(parts[2]) == 4:
+        day, month, year = parts
+    else:
+        return ""
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return ""
+
+
+def parse_amount(text: str) -> tuple[float, str] | None:
+    """Return (value, commodity) of a posting amount, None if there is none.
+
+    Parameters
+    ----------
+    text : str
+        E.g "20.79 GBP", "GBP -20.79", "-£1,234.56" or "10 EUR @ 0.86 GBP"
+
+    Returns
+    -------
+    tuple[float, str] | None
+        E.g (-1234.56, "£")
+    """
+    text = AMOUNT_END_PATTERN.split(text, maxsplit=1)[0].strip()
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    number = match.group()
+    commodity = (text[: match.start()] + text[match.end() :]).strip()
+    # The sign may also precede the commodity, E.g "-£20.79"
+    negative = number.startswith("-") or commodity.startswith("-")
+    commodity = commodity.lstrip("-").strip().strip('"')
+    value = float(number.lstrip("-").strip().replace(",", ""))
+    return (-value if negative else value), commodity
+
+
+def parse_xact(offset: int, block: str) -> LedgerXact | None:
+    """Parse the text of one transaction block, None if it has no valid date."""
+    if "\r" in block:
+        block = block.replace("\r", "")
+    header, _, postings_text = block.lstrip("\ufeff").partition("\n")
+    match = HEADER_PATTERN.match(header)
+    date_str = parse_date(match.group(1)) if match else ""
+    if not date_str:
+        return None
+    payee = match.group(2)
+    if not payee.isascii():
+        payee = unicodedata.normalize("NFKD", payee)
+    postings = []
+    for account, amount_text in POSTING_PATTERN.findall(postings_text):
+        amount = parse_amount(amount_text) if amount_text else None
+        # Virtual postings, E.g "(Budget:Food)", are read as real ones
+        account = account.strip("()[]")
+        if amount is None:
+            postings.append(LedgerPosting(account, None, ""))
+        else:
+            postings.append(LedgerPosting(account, *amount))
+    return LedgerXact(offset, date_str, payee, postings)
+
+
+def iter_xacts(data: bytes | mmap.mmap, start: int = 0) -> Iterator[LedgerXact]:
+    """Yield the transactions of utf-8 ledger text data, from byte start on.
+
+    Transaction blocks are found in data without decoding it, so data may
+    be a memory map of a large file. start must be the start of a line.
+    """
+    for match in BLOCK_PATTERN.finditer(data, start):
+        if match.group(1) is not None:
+            xact = _simple_xact(match)
+            if xact is not None:
+                yield xact
+                continue
+        xact = parse_xact(
+            match.start(), match.group().decode("utf-8", errors="replace")
+        )
+        if xact is not None:
+            yield xact
+
+
+def _simple_xact(match: re.Match) -> LedgerXact | None:
+    """Build the transaction matched by SIMPLE_XACT, None if its date is invalid."""
+    date_str, payee, target, amount, commodity, source = match.groups()
+    try:
+        date_str = date.fromisoformat(date_str.decode()).isoformat()
+    except ValueError:
+        return None
+    payee = payee.decode("utf-8", errors="replace").rstrip()
+    if not payee.isascii():
+        payee = unicodedata.normalize("NFKD", payee)
+    return LedgerXact(
+        match.start(),
+        date_str,
+        payee,
+        [
+            LedgerPosting(
+                target.decode("utf-8", errors="replace"),
+                float(amount),
+                commodity.decode(),
+            ),
+            LedgerPosting(source.decode("utf-8", errors="replace"), None, ""),
+        ],
+    )
+
+
+def xact_to_row(xact: LedgerXact) -> tuple | None:
+    """Return the history row of a two posting transaction, in COLUMNS order.
+
+    The source account is the posting with the elided amount, or, if both
+    amounts are given, the only Assets or Liabilities posting, or else the
+    last posting, as written by Xact.to_ledger_str. Other transactions
+    aren't suitable to learn categories from, and None is returned.
+    """
+    if len(xact.postings) != 2:
+        return None
+    first, second = xact.postings
+    if first.amount is None and second.amount is None:
+        return None
+    if first.amount is None:
+        source, target = first, second
+    elif second.amount is None:
+        source, target = second, first
+    elif first.account.startswith(("Assets", "Liabilities")) and not (
+        second.account.startswith(("Assets", "Liabilities"))
+    ):
+        source, target = first, second
+    else:
+        source, target = second, first
+    return (
+        xact.date_str,
+        xact.payee,
+        source.account,
+        target.account,
+        -target.amount,
+        target.commodity,
+    )
+
+
+def scan_ledger(file_path: str, state: dict | None = None) -> LedgerScan | None:
+    """Parse what changed in a utf-8 ledger file since the last scan.
+
+    If the file only grew since the scan that returned state, E.g because
+    transactions were appended, parsing restarts at the last transaction
+    scanned, which may have gained postings, instead of at the start.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the .ledger file
+    state : dict | None
+        LedgerScan.state of the previous scan of file_path, None to scan
+        the whole file
+
+    Returns
+    -------
+    LedgerScan | None
+        The transactions parsed, None if the file is unchanged
+    """
+    stat = os.stat(file_path)
+    if state and [stat.st_size, stat.st_mtime_ns] == state["stat"]:
+        return None
+    with open(file_path, "rb") as f:
+        start = (
+            state["resume"]
+            if state and is_extended(f, stat.st_size, state["stat"][0], state["tail"])
+            else 0
+        )
+        if stat.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                xacts = list(iter_xacts(data, start))
+                tail = data[max(stat.st_size - TAIL_SIZE, 0) :]
+        else:
+            xacts, tail = [], b""
+    return LedgerScan(
+        xacts=xacts,
+        start=start,
+        state={
+            "stat": [stat.st_size, stat.st_mtime_ns],
+            "tail": tail.hex(),
+            # The last transaction may still be appended to
+            "resume": xacts[-1].offset if xacts else start,
+        },
+    )
@@ -1,15 +1,19 @@
-import argparse
-import pandas as pd
+import glob
+import json
 import os
-from santan2ledger.parser import Parser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from santan2ledger.columns import from_fixed, to_ordinal
+from santan2ledger.journal import SessionJournal
+from santan2ledger.parser import Parser, StatementRecord, StatementTable
+from santan2ledger.profiling import profiler
+from santan2ledger.review import ReviewApp
 from santan2ledger.selector import Selector
 from santan2ledger.xact import Xact
 import santan2ledger.colors as colors
 
-# TODO: Add matching also according to amounts
 # TODO: Add title page
 # TODO: Polish UI
-# TODO: Package for installation and portability
 # TODO: Add README.md
 
 
@@ -19,157 +23,570 @@ MODULE_PATH = os.path.abspath(
 ROOT_PATH = os.path.dirname(MODULE_PATH)
 
 
-def main(statement_file_name: str, account_key: str, date_after: str) -> None:
+def row_to_xact(
+    record: StatementRecord, source_account: str, default_commodity: str
+) -> Xact:
+    """Create an Xact, without target account, from a statement record."""
+    return Xact(
+        source_account=source_account,
+        amount=record.amount,
+        description=record.description,
+        date_str=record.date.isoformat(),
+        commodity=record.commodity if record.commodity else default_commodity,
+    )
+
+
+def save_session(journal: SessionJournal, selector: Selector) -> None:
+    """Write the journaled transactions to the files and history, end the session."""
+    journal.flush()
+    selector.update_prev_xact_file()
+    journal.close()
+
+
+def save_sessions(journals: list[SessionJournal], selector: Selector) -> None:
+    """Like save_session for several sessions, writing their files in parallel.
+
+    The sessions must write to different ledger and accounts files.
+    """
+    with profiler.stage("flush"):
+        with ThreadPoolExecutor(max_workers=len(journals)) as executor:
+            list(executor.map(SessionJournal.flush, journals))
+    selector.update_prev_xact_file()
+    for journal in journals:
+        journal.close()
+
+
+def recover_session(journal: SessionJournal, selector: Selector) -> None:
+    """Finish saving a session that was interrupted, E.g by a crash."""
+    xacts = journal.recover()
+    if xacts:
+        selector.restore_xacts(xacts)
+        print(
+            f"Recovered {colors.green(str(len(xacts)))} transactions"
+            " of an interrupted session..."
+        )
+
+
+def journal_path(account_key: str = "") -> str:
+    """Return the path of the session journal, of account_key with --all-accounts."""
+    if account_key:
+        return f"{MODULE_PATH}/data/session.{account_key}.journal"
+    return MODULE_PATH + "/data/session.journal"
+
+
+def recover_sessions(selector: Selector) -> None:
+    """Recover every interrupted session, including those of --all-accounts."""
+    for path in sorted(glob.glob(MODULE_PATH + "/data/session*.journal")):
+        recover_session(SessionJournal(path=path), selector)
+
+
+def confirm_save() -> bool:
+    """Ask whether to save the progress of an interrupted session."""
+    while True:
+        save_progress = input(
+            f"Save progress? [{colors.green('y')}]/[{colors.red('n')}]: "
+        )
+        if save_progress not in ("y", "n"):
+            print(f"{save_progress} is not a valid option! Please type y or n...")
+            continue
+        return save_progress == "y"
+
+
+def read_statement(parser: Parser, statement_file_name: str) -> StatementTable:
+    """Read the statement(s) of an account, earliest transaction first.
+
+    Parameters
+    ----------
+    parser : Parser
+        Parser of the account
+    statement_file_name : str
+        Name of the .txt file in the Statements dir, or a glob pattern to
+        merge all matching files, E.g "Statements*.txt"
+
+    Returns
+    -------
+    StatementTable
+        Transactions of the file(s)
+    """
+    if glob.has_magic(statement_file_name):
+        # Merge all matching files, already earliest first and deduplicated
+        from santan2ledger.ingest import ingest_statements
+
+        with profiler.stage("ingest"):
+            return StatementTable.from_records(
+                ingest_statements(parser=parser, pattern=statement_file_name)
+            )
+    statement_file_path = parser.statements_dir + statement_file_name
+    statement = parser.read_table(file_path=statement_file_path)
+    # Also reverse the order, so that earliest transactions appear first
+    return statement.take(reversed(range(len(statement))))
+
+
+def new_rows(
+    selector: Selector, statement: StatementTable, source_account: str, date_after: str
+) -> StatementTable:
+    """Return the rows of statement to categorise.
+
+    Parameters
+    ----------
+    selector : Selector
+        Selector holding the history of source_account
+    statement : StatementTable
+        Statement of source_account, see read_statement
+    source_account : str
+        Account the transactions come from
+    date_after : str
+        Only keep rows after this "dd-mm-yyyy" or "dd/mm/yyyy" date, if ''
+        keep the rows that were not imported before
+
+    Returns
+    -------
+    StatementTable
+        The rows of statement kept
+    """
+    if date_after:
+        after = datetime.strptime(date_after.replace("-", "/"), "%d/%m/%Y")
+        return statement.take(
+            i for i, day in enumerate(statement.dates) if day > after.toordinal()
+        )
+    imported, legacy_last_date = selector.imported_xacts(source_account)
+    # Rows imported before fingerprints were recorded can only be
+    # recognised by date
+    after = 0
+    if legacy_last_date:
+        print(f"Last recorded date: {colors.magenta(legacy_last_date)}")
+        after = to_ordinal(legacy_last_date)
+    # Only consider transactions not already imported
+    return statement.take(
+        i
+        for i, day in enumerate(statement.dates)
+        if day > after and statement.fingerprint(i) not in imported
+    )
+
+
+def auto_categorise(
+    selector: Selector,
+    journal: SessionJournal,
+    statement: StatementTable,
+    source_account: str,
+    default_commodity: str,
+    threshold: int,
+) -> tuple[StatementTable, list[tuple[str, int]]]:
+    """Assign the suggested account to every confidently matched transaction.
+
+    The matched transactions are journaled and added to the history,
+    without prompting. They are written once the session is saved.
+
+    Parameters
+    ----------
+    selector : Selector
+        Selector holding the history of source_account
+    journal : SessionJournal
+        Journal of the current session
+    statement : StatementTable
+        New statement rows, see Parser.read_table
+    source_account : str
+        Account the transactions come from
+    default_commodity : str
+        Commodity used for rows without one
+    threshold : int
+        Minimum score (0-100) of the suggestion to accept it. The text
+        similarity must be at least as high, see Scorer
+
+    Returns
+    -------
+    tuple[StatementTable, list[tuple[str, int]]]
+        The rows of statement that were not matched confidently enough,
+        and the (suggested account, score) of each of them
+    """
+    suggestions = selector.precompute_suggestions(
+        statement.descriptions,
+        [from_fixed(amount) for amount in statement.amounts],
+        min_score=0,
+    )
+    auto_xacts = []
+    unmatched = []
+    for i, (suggestion, score) in enumerate(suggestions):
+        if not suggestion or score < threshold:
+            unmatched.append(i)
+            continue
+        xact = row_to_xact(statement[i], source_account, default_commodity)
+        xact.target_account = suggestion
+        journal.add(xact, fingerprint=statement.fingerprint(i))
+        selector.append_xact_to_prev_df(xact, fingerprint=statement.fingerprint(i))
+        auto_xacts.append(xact)
+
+    print(
+        f"{colors.green(str(len(auto_xacts)))} transactions categorised automatically..."
+    )
+    return statement.take(unmatched), [suggestions[i] for i in unmatched]
+
+
+def write_review_file(
+    review_file: str, statement: StatementTable, suggestions: list[tuple[str, int]]
+) -> None:
+    """Write the rows left by auto_categorise, with their suggestions, to a csv."""
+    statement.write_csv(
+        review_file,
+        {
+            "Suggestion": [suggestion for suggestion, _ in suggestions],
+            "Score": [score for _, score in suggestions],
+        },
+    )
+    print(
+        f"{colors.yellow(str(len(statement)))} transactions left"
+        f" for review in {colors.magenta(review_file)}"
+    )
+
+
+async def review_rows(
+    app: ReviewApp,
+    selector: Selector,
+    journal: SessionJournal,
+    statement: StatementTable,
+    source_account: str,
+    default_commodity: str,
+    title: str = "",
+) -> None:
+    """Prompt for the target account of every row of statement, in order.
+
+    Entering "k" undoes the previous row.
+
+    Parameters
+    ----------
+    app : ReviewApp
+        Running review application
+    selector : Selector
+        Selector holding the history
+    journal : SessionJournal
+        Journal of the session the rows belong to
+    statement : StatementTable
+        Rows to categorise
+    source_account : str
+        Account the transactions come from
+    default_commodity : str
+        Commodity used for rows without one
+    title : str
+        Shown before the progress, E.g "santander: "
+    """
+    idx = 0
+    while True:
+        xact = row_to_xact(statement[idx], source_account, default_commodity)
+        input_str = await app.get_target_account(
+            xact=xact,
+            progress=f"{title}Account No. {idx + 1} / {len(statement)}",
+        )
+        if input_str == "k":
+            if idx > 0:
+                idx -= 1
+                journal.pop()
+                selector.pop_last_xact()  # Remove last row
+            else:
+                idx = 0
+
+            continue
+        else:
+            xact.target_account = input_str
+            journal.add(xact, fingerprint=statement.fingerprint(idx))
+            selector.append_xact_to_prev_df(
+                xact, fingerprint=statement.fingerprint(idx)
+            )
+            idx += 1
+
+            if idx == len(statement):
+                break  # TODO: Add keybinding to quit
+
+
+def main(
+    statement_file_name: str,
+    account_key: str,
+    date_after: str,
+    source_account: str = "",
+    default_commodity: str = "",
+    auto: bool = False,
+    threshold: int = 90,
+    review_file: str = "",
+    config_path: str = ROOT_PATH + "/config.json",
+) -> None:
+    # Define objects used for printing, selecting and parsing
+    parser = Parser(
+        account_key=account_key,
+        config_path=config_path,
+        cache_dir=MODULE_PATH + "/data",
+    )
+    # Account selector object, its history is also seeded from the ledgers
+    selector = Selector(
+        data_dir=MODULE_PATH + "/data",
+        ledger_file_paths=parser.ledger_file_paths,
+        rules=parser.rules,
+    )
+    # Every accepted transaction is journaled before anything else happens
+    journal = SessionJournal(path=journal_path())
     try:
-        # Define objects used for printing, selecting and parsing
-        selector = Selector(
-            data_dir=MODULE_PATH + "/data"
-        )  # Initiate account selector object
-        parser = Parser(account_key=account_key, config_path=ROOT_PATH + "/config.json")
+        recover_sessions(selector)
         # Backup ledger and accounts file
         parser.make_backup()
         # Get list of previously defined accounts from accounts.ledger
         prev_accounts = parser.get_account_list()
-        source_account = selector.autocomplete_prompt(
-            items=prev_accounts, message="Source Account: "
-        )
-        selector.prev_xact_df = selector.prev_xact_df.loc[
-            selector.prev_xact_df["source_account"] == source_account
-        ]
-        default_commodity = selector.autocomplete_prompt(
-            items=["GBP", "CHF"], message="Default commodity: "
-        )
-        # Read in statements from .txt file
-        statement_file_path = parser.statements_dir + statement_file_name
-        # Also reverse the order, so that earliest transactions appear first
-        statement_df = parser.txt_to_df(file_path=statement_file_path).iloc[::-1]
-        if date_after:
-            statement_df = statement_df.loc[
-                statement_df["Date"]
-                > pd.to_datetime(date_after.replace("-", "/"), format="%d/%m/%Y")
-            ]
-        elif not selector.prev_xact_df.empty:
-            last_recorded_date = (  # TODO: Use last row matching instead of date matching
-                pd.to_datetime(
-                    selector.prev_xact_df.loc[
-                        selector.prev_xact_df["source_account"] == source_account
-                    ]["date_str"],
-                    format="%Y/%m/%d",
-                )
-                .tail(1)
-                .item()
+        selector.add_accounts(prev_accounts)
+        if not source_account:
+            source_account = selector.autocomplete_prompt(
+                completer=selector.account_completer, message="Source Account: "
+            )
+        if not default_commodity:
+            default_commodity = selector.autocomplete_prompt(
+                items=["GBP", "CHF"], message="Default commodity: "
             )
-            print(f"Last recorded date: {colors.magenta(str(last_recorded_date))}")
-            # Only consider transactions entered after last_recorded_date
-            statement_df = statement_df.loc[statement_df["Date"] > last_recorded_date]
+        # Only now pay for loading the history of source_account
+        selector.filter_source_account(source_account)
+        # Read in statements from .txt file(s)
+        statement = new_rows(
+            selector,
+            read_statement(parser, statement_file_name),
+            source_account,
+            date_after,
+        )
 
-        if statement_df.empty:
+        if not len(statement):
             print(colors.red("No (new) statements found!"))
             return None
         # Get list of already defined accounts
-        print(f"{colors.green(str(statement_df.shape[0]))} transactions found...")
-        new_xacts = []
-
-        idx = 0
-        while True:
-            os.system("clear")
-            print(selector.prev_xact_df.tail(5))
-            row = statement_df.iloc[idx]
-            xact = Xact(
+        print(f"{colors.green(str(len(statement)))} transactions found...")
+        journal.begin(
+            ledger_file_path=parser.ledger_file_path,
+            accounts_file_path=parser.accounts_file_path,
+            accounts=prev_accounts,
+        )
+        if auto:
+            statement, suggestions = auto_categorise(
+                selector=selector,
+                journal=journal,
+                statement=statement,
                 source_account=source_account,
-                amount=row["Amount"],
-                description=row["Description"],
-                date_str=str(row["Date"].date()),
-                commodity=row["Commodity"] if row["Commodity"] else default_commodity,
+                default_commodity=default_commodity,
+                threshold=threshold,
             )
-            input_str = selector.get_target_account(
-                xact=xact,
-                prev_account_list=prev_accounts,
-                progress=f"Account No. {idx + 1} / {statement_df.shape[0]}",
+            # The matched transactions are written straight away
+            save_session(journal, selector)
+            if not len(statement):
+                print("Finished!")
+                return None
+            if review_file:
+                write_review_file(review_file, statement, suggestions)
+                return None
+            # Review the rest in a new session, which may use the new accounts
+            prev_accounts = parser.get_account_list()
+            selector.add_accounts(prev_accounts)
+            journal.begin(
+                ledger_file_path=parser.ledger_file_path,
+                accounts_file_path=parser.accounts_file_path,
+                accounts=prev_accounts,
             )
-            if input_str == "k":
-                if idx > 0:
-                    idx -= 1
-                    new_xacts.pop()
-                else:
-                    idx = 0
-
-                selector.prev_xact_df = selector.prev_xact_df[:-1]  # Remove last row
-                continue
-            else:
-                xact.target_account = input_str
-                selector.append_xact_to_prev_df(xact)
-                new_xacts.append(xact)
-                idx += 1
-
-                if idx == statement_df.shape[0]:
-                    print("Finished!")
-                    break  # TODO: Add keybinding to quit
-
-        selector.update_prev_xact_file()
-
-        parser.append_xacts_to_ledger_file(new_xacts)
-        # Only add accounts not originally in accounts.ledger
-        parser.append_accounts_to_file(
-            list(
-                selector.new_accounts.difference(set(prev_accounts)).difference(
-                    {"", "k", "p"}
-                )
+        # Score the statement against the history in the background, in order,
+        # so suggestions for the upcoming rows are ready before they are shown
+        selector.prefetch_suggestions(statement.descriptions)
+
+        # One full-screen application for all rows, each row is only a redraw
+        ReviewApp(selector).run(
+            lambda app: review_rows(
+                app, selector, journal, statement, source_account, default_commodity
             )
         )
+        print("Finished!")
+        save_session(journal, selector)
     except KeyboardInterrupt:
         print("Detected KeyboardInterrupt, quitting...")
-        while True:
-            save_progress = input(
-                f"Save progress? [{colors.green('y')}]/[{colors.red('n')}]: "
+        if confirm_save():
+            save_session(journal, selector)
+            print(f"Progress saved! {colors.green('FINISHED')}...")
+        else:
+            journal.discard()
+            print(f"Exiting! Progress {colors.red('NOT')} saved!")
+    finally:
+        selector.close()
+
+
+def main_all_accounts(
+    statement_file_name: str,
+    date_after: str,
+    default_commodity: str = "",
+    auto: bool = False,
+    threshold: int = 90,
+    review_file: str = "",
+    config_path: str = ROOT_PATH + "/config.json",
+) -> None:
+    """Categorise the statements of every account in the config in one run.
+
+    The history and matching index are loaded once and shared by all
+    accounts. Their statements are read concurrently, while the source
+    accounts are prompted for, and reviewed back to back in one full-screen
+    application. The ledger and accounts files of all accounts are written
+    in parallel, with auto once the matched transactions are assigned, and
+    at the end.
+
+    Parameters
+    ----------
+    statement_file_name : str
+        Statement file name or glob pattern of each account, with
+        "{account_key}" replaced by its key, E.g "{account_key}*.txt"
+    date_after : str
+        See new_rows
+    default_commodity : str
+        Commodity used for rows without one, prompted for if ''
+    auto : bool
+        Assign confidently matched suggestions without prompting
+    threshold : int
+        Minimum score (0-100) of a suggestion for auto to accept it
+    review_file : str
+        With auto, write the rows left of each account to this csv, with
+        ".{account_key}" added before the extension, instead of prompting
+    config_path : str
+        Path of config.json. Its optional "source_accounts" maps account
+        keys to their source account, the others are prompted for
+    """
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    account_keys = list(config["other_ledger_files"])
+    source_accounts = dict(config.get("source_accounts", {}))
+    parsers = {
+        key: Parser(
+            account_key=key, config_path=config_path, cache_dir=MODULE_PATH + "/data"
+        )
+        for key in account_keys
+    }
+    file_paths = [
+        file_path
+        for parser in parsers.values()
+        for file_path in (parser.ledger_file_path, parser.accounts_file_path)
+    ]
+    if len(set(file_paths)) != len(file_paths):
+        raise ValueError(
+            "Every account needs its own ledger and accounts file for --all-accounts"
+        )
+    # Every parser knows all ledger files and rules of the config
+    selector = Selector(
+        data_dir=MODULE_PATH + "/data",
+        ledger_file_paths=parsers[account_keys[0]].ledger_file_paths,
+        rules=parsers[account_keys[0]].rules,
+    )
+    # Nothing is written to the files until all sessions are saved
+    journals = {
+        key: SessionJournal(path=journal_path(key), flush_every=0)
+        for key in account_keys
+    }
+    executor = ThreadPoolExecutor(max_workers=len(account_keys))
+    try:
+        recover_sessions(selector)
+        # Read the statements while the prompts are answered
+        statements = {
+            key: executor.submit(
+                read_statement,
+                parsers[key],
+                statement_file_name.format(account_key=key),
             )
-            if save_progress not in ("y", "n"):
-                print(f"{save_progress} is not a valid option! Please type y or n...")
+            for key in account_keys
+        }
+        # The backups share one store, so they are made one at a time
+        for parser in parsers.values():
+            parser.make_backup()
+        prev_accounts = {key: parsers[key].get_account_list() for key in account_keys}
+        for accounts in prev_accounts.values():
+            selector.add_accounts(accounts)
+        for key in account_keys:
+            if not source_accounts.get(key):
+                source_accounts[key] = selector.autocomplete_prompt(
+                    completer=selector.account_completer,
+                    message=f"Source Account ({key}): ",
+                )
+        if not default_commodity:
+            default_commodity = selector.autocomplete_prompt(
+                items=["GBP", "CHF"], message="Default commodity: "
+            )
+        # The whole history is loaded once and shared by all accounts
+        selector.filter_source_account("")
+
+        sessions = []
+        for key in account_keys:
+            statement = new_rows(
+                selector, statements[key].result(), source_accounts[key], date_after
+            )
+            print(f"{key}: {colors.green(str(len(statement)))} transactions found...")
+            if not len(statement):
                 continue
-            elif save_progress == "y":
-                selector.update_prev_xact_file()
-
-                parser.append_xacts_to_ledger_file(new_xacts)
-                # Only add accounts not originally in accounts.ledger
-                parser.append_accounts_to_file(
-                    list(
-                        selector.new_accounts.difference(set(prev_accounts)).difference(
-                            {"", "k", "p"}
-                        )
-                    )
+            journals[key].begin(
+                ledger_file_path=parsers[key].ledger_file_path,
+                accounts_file_path=parsers[key].accounts_file_path,
+                accounts=prev_accounts[key],
+            )
+            if auto:
+                statement, suggestions = auto_categorise(
+                    selector=selector,
+                    journal=journals[key],
+                    statement=statement,
+                    source_account=source_accounts[key],
+                    default_commodity=default_commodity,
+                    threshold=threshold,
+                )
+                if review_file and len(statement):
+                    root, ext = os.path.splitext(review_file)
+                    write_review_file(f"{root}.{key}{ext}", statement, suggestions)
+                    continue
+            if len(statement):
+                sessions.append((key, statement))
+        if auto:
+            # The matched transactions are written straight away
+            save_sessions(list(journals.values()), selector)
+            # Review the rest in new sessions, which may use the new accounts
+            for key, _ in sessions:
+                prev_accounts[key] = parsers[key].get_account_list()
+                selector.add_accounts(prev_accounts[key])
+                journals[key].begin(
+                    ledger_file_path=parsers[key].ledger_file_path,
+                    accounts_file_path=parsers[key].accounts_file_path,
+                    accounts=prev_accounts[key],
                 )
-                print(f"Progress saved! {colors.green('FINISHED')}...")
-                break
-            else:
-                print(f"Exiting! Progress {colors.red('NOT')} saved!")
-                break
 
+        if sessions:
+            # Suggestions are prefetched in the order the rows are reviewed
+            selector.prefetch_suggestions(
+                [
+                    description
+                    for _, statement in sessions
+                    for description in statement.descriptions
+                ]
+            )
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()  # For command line args
+            async def review(app: ReviewApp) -> None:
+                for key, statement in sessions:
+                    await review_rows(
+                        app,
+                        selector,
+                        journals[key],
+                        statement,
+                        source_accounts[key],
+                        default_commodity,
+                        title=f"{key}: ",
+                    )
 
-    parser.add_argument(
-        "statements_file_name",
-        help="Santander exported txt file to parse.",
-    )
-    parser.add_argument(
-        "-d",
-        "--date-after",
-        dest="date_after",
-        help="Date to start parsing transactions after.",
-    )
-    parser.add_argument(
-        "account_key",
-        help="Key corresponding to account for ledger and accounts files from config.json",
-    )
-    args = parser.parse_args()
+            # One full-screen application for all accounts
+            ReviewApp(selector).run(review)
+        print("Finished!")
+        save_sessions(list(journals.values()), selector)
+    except KeyboardInterrupt:
+        print("Detected KeyboardInterrupt, quitting...")
+        if confirm_save():
+            save_sessions(list(journals.values()), selector)
+            print(f"Progress saved! {colors.green('FINISHED')}...")
+        else:
+            for journal in journals.values():
+                journal.discard()
+            print(f"Exiting! Progress {colors.red('NOT')} saved!")
+    finally:
+        executor.shutdown(cancel_futures=True)
+        selector.close()
 
-    main(
-        statement_file_name=args.statements_file_name,
-        account_key=args.account_key,
-        date_after=args.date_after,
-    )
 
-    # For testing
-    # statement_file_name = "Statements09012964141909.txt"
-    # main(statement_file_name)
+if __name__ == "__main__":
+    from santan2ledger.cli import main as cli_main
+
+    cli_main()
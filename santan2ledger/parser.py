@@ -1,19 +1,364 @@
-import chardet
-import pandas as pd
+from __future__ import annotations
+import codecs
+import csv
+import hashlib
 import unicodedata
-import re
 import json
-import shutil
 import os
-from datetime import date
-from santan2ledger.xact import Xact
+import sys
+from array import array
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple
+from santan2ledger.accounts import AccountIndex
+from santan2ledger.backup import BackupStore
+from santan2ledger.columns import Dictionary, from_fixed, to_fixed
+from santan2ledger.profiling import profiled
+from santan2ledger.rules import RuleSet
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from santan2ledger.statement_cache import StatementCache
+
+
+class StatementRecord(NamedTuple):
+
+    """A single transaction read from a Santander statement export."""
+
+    date: date
+    description: str
+    amount: float
+    commodity: str
+    balance: float
+
+    @property
+    def fingerprint(self) -> str:
+        """Identity of the transaction, see fingerprint()."""
+        return fingerprint(self.date, self.description, self.amount, self.balance)
+
+
+def fingerprint(date: date, description: str, amount: float, balance: float) -> str:
+    """Return a short hash identifying a statement transaction.
+
+    The running balance tells apart otherwise identical transactions made on
+    the same day, E.g two TFL fares.
+
+    Parameters
+    ----------
+    date : date
+        Date of the transaction
+    description : str
+        Transaction description as exported
+    amount : float
+        Transaction amount
+    balance : float
+        Account balance after the transaction
+
+    Returns
+    -------
+    str
+        16 character hex digest
+    """
+    key = f"{date.isoformat()}|{description.strip()}|{amount:.2f}|{balance:.2f}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+# Bump whenever iter_statement reads a file differently, so statements
+# parsed by an older version are not loaded from the StatementCache
+PARSER_VERSION = 1
+
+# Byte order marks checked before any content based detection, longest first
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def records_to_df(records: Iterable[StatementRecord]) -> pd.DataFrame:
+    """Build a statement DataFrame from records.
+
+    Parameters
+    ----------
+    records : Iterable[StatementRecord]
+        E.g Parser.iter_statement(file_path)
+
+    Returns
+    -------
+    pd.DataFrame
+        Pandas DataFrame with columns
+        Date, Description, Amount, Balance, Commodity, Fingerprint
+    """
+    import pandas as pd
+
+    records = list(records)
+    df = pd.DataFrame.from_records(records, columns=StatementRecord._fields).rename(
+        columns=str.capitalize
+    )
+    df["Date"] = pd.to_datetime(df["Date"])
+    df["Fingerprint"] = [record.fingerprint for record in records]
+    return df[["Date", "Description", "Amount", "Balance", "Commodity", "Fingerprint"]]
+
+
+class StatementTable:
+
+    """Statement transactions held in compact typed columns.
+
+    Dates are stored as ordinals, amounts and balances as fixed point
+    integers (see santan2ledger.columns), commodities dictionary encoded
+    and fingerprints as 64 bit integers. Indexing returns a StatementRecord.
+    The columns of a table loaded by from_bytes are read only memoryviews.
+    """
+
+    __slots__ = (
+        "dates",
+        "descriptions",
+        "amounts",
+        "balances",
+        "_commodities",
+        "_commodity_codes",
+        "_fingerprints",
+    )
+
+    def __init__(self, commodities: Dictionary | None = None):
+        """Create an empty table.
+
+        Parameters
+        ----------
+        commodities : Dictionary | None
+            Dictionary encoding the commodity column, shared by take()
+        """
+        self.dates = array("i")
+        self.descriptions = []
+        self.amounts = array("q")
+        self.balances = array("q")
+        self._commodities = Dictionary() if commodities is None else commodities
+        self._commodity_codes = array("I")
+        self._fingerprints = array("Q")
+
+    @classmethod
+    def from_records(cls, records: Iterable[StatementRecord]) -> StatementTable:
+        """Build a table from records, E.g Parser.iter_statement(file_path)."""
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, i: int) -> StatementRecord:
+        return StatementRecord(
+            date=date.fromordinal(self.dates[i]),
+            description=self.descriptions[i],
+            amount=from_fixed(self.amounts[i]),
+            commodity=self._commodities.decode(self._commodity_codes[i]),
+            balance=from_fixed(self.balances[i]),
+        )
+
+    def __iter__(self) -> Iterator[StatementRecord]:
+        return (self[i] for i in range(len(self)))
+
+    def append(self, record: StatementRecord) -> None:
+        """Add record to the end of the table."""
+        self.dates.append(record.date.toordinal())
+        self.descriptions.append(record.description)
+        self.amounts.append(to_fixed(record.amount))
+        self.balances.append(to_fixed(record.balance))
+        self._commodity_codes.append(self._commodities.encode(record.commodity))
+        self._fingerprints.append(int(record.fingerprint, 16))
+
+    def fingerprint(self, i: int) -> str:
+        """Return the fingerprint of row i, see fingerprint()."""
+        return f"{self._fingerprints[i]:016x}"
+
+    def take(self, indices: Iterable[int]) -> StatementTable:
+        """Return a new table of the rows at indices, in that order.
+
+        Parameters
+        ----------
+        indices : Iterable[int]
+            Row positions, E.g reversed(range(len(table))) to reverse it
+
+        Returns
+        -------
+        StatementTable
+            Table sharing the commodity dictionary of this one
+        """
+        table = StatementTable(self._commodities)
+        for i in indices:
+            table.dates.append(self.dates[i])
+            table.descriptions.append(self.descriptions[i])
+            table.amounts.append(self.amounts[i])
+            table.balances.append(self.balances[i])
+            table._commodity_codes.append(self._commodity_codes[i])
+            table._fingerprints.append(self._fingerprints[i])
+        return table
+
+    def to_df(self) -> pd.DataFrame:
+        """Return the table as a DataFrame, see records_to_df. Requires pandas."""
+        return records_to_df(self)
+
+    def _columns(self) -> dict[str, array]:
+        return {
+            "dates": self.dates,
+            "amounts": self.amounts,
+            "balances": self.balances,
+            "commodity_codes": self._commodity_codes,
+            "fingerprints": self._fingerprints,
+        }
+
+    def to_bytes(self) -> bytes:
+        """Serialise the table in a binary columnar form, see from_bytes.
+
+        A JSON header line describing the columns is followed by the raw
+        bytes of each array column and the newline joined utf-8
+        descriptions, each 8 byte aligned so they can be used in place
+        from a memory mapped file.
+        """
+        columns = self._columns()
+        blobs = {name: column.tobytes() for name, column in columns.items()}
+        blobs["descriptions"] = "\n".join(self.descriptions).encode()
+        header = {
+            "rows": len(self),
+            "byteorder": sys.byteorder,
+            "commodities": self._commodities.values,
+            # Column name -> [item size, offset after the header, size]
+            "columns": {},
+        }
+        offset = 0
+        for name, blob in blobs.items():
+            itemsize = columns[name].itemsize if name in columns else 1
+            header["columns"][name] = [itemsize, offset, len(blob)]
+            offset += -(-len(blob) // 8) * 8
+        head = json.dumps(header).encode()
+        data = bytearray(head + b" " * (-(len(head) + 1) % 8) + b"\n")
+        start = len(data)
+        for name, blob in blobs.items():
+            data.extend(bytes(start + header["columns"][name][1] - len(data)))
+            data.extend(blob)
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview) -> StatementTable | None:
+        """Load a table serialised by to_bytes, E.g from a memory mapped file.
+
+        The number columns are memoryviews of data, nothing is copied but
+        the descriptions. Returns None if data was written on a platform
+        with another byte order or array item sizes.
+        """
+        data = memoryview(data)
+        start = bytes(data[:65536]).index(b"\n") + 1
+        header = json.loads(bytes(data[:start]))
+        if header["byteorder"] != sys.byteorder:
+            return None
+        table = cls()
+        for value in header["commodities"]:
+            table._commodities.encode(value)
+        columns = table._columns()
+        views = {}
+        for name, (itemsize, offset, size) in header["columns"].items():
+            blob = data[start + offset : start + offset + size]
+            if name == "descriptions":
+                if header["rows"]:
+                    table.descriptions = str(blob, "utf-8").split("\n")
+            elif columns[name].itemsize != itemsize:
+                return None
+            else:
+                views[name] = blob.cast(columns[name].typecode)
+        table.dates = views["dates"]
+        table.amounts = views["amounts"]
+        table.balances = views["balances"]
+        table._commodity_codes = views["commodity_codes"]
+        table._fingerprints = views["fingerprints"]
+        return table
+
+    def write_csv(self, path: str, extra_columns: dict[str, list] = {}) -> None:
+        """Write the table to a .csv file at path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file to write
+        extra_columns : dict[str, list]
+            Further columns to append, each with one value per row,
+            E.g {"Suggestion": [...], "Score": [...]}
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["Date", "Description", "Amount", "Balance", "Commodity", "Fingerprint"]
+                + list(extra_columns)
+            )
+            for i, record in enumerate(self):
+                writer.writerow(
+                    [
+                        record.date.isoformat(),
+                        record.description,
+                        record.amount,
+                        record.balance,
+                        record.commodity,
+                        self.fingerprint(i),
+                    ]
+                    + [values[i] for values in extra_columns.values()]
+                )
+
+
+def _decodes(f, encoding: str, chunk_size: int) -> bool:
+    """Whether the whole binary file f decodes with encoding."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        f.seek(0)
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return True
+
+
+def _fallback_encoding(f, detected: str | None, chunk_size: int) -> str:
+    """Return the encoding of f once utf-8 failed on it, one that decodes f.
+
+    cp1252, the encoding of Santander exports, is preferred to the other
+    single byte Latin encodings chardet confuses it with when it sees few
+    non-ASCII bytes. ASCII, E.g if chardet only saw an ASCII prefix, is
+    never returned. latin-1 can decode any bytes, so it is the last resort.
+    """
+    candidates = [detected, "cp1252"]
+    if detected and detected.lower().startswith(("iso-8859", "iso8859", "windows")):
+        candidates.reverse()
+    for encoding in candidates:
+        if (
+            encoding
+            and encoding.lower() not in ("ascii", "utf-8")
+            and _decodes(f, encoding, chunk_size)
+        ):
+            return encoding
+    return "latin-1"
 
 
 class Parser:
 
     """Object used to parse data."""
 
-    def __init__(self, account_key: str, config_path: str):
+    # (file path, size, mtime) -> encoding, shared by all Parser instances
+    _encoding_cache = {}
+
+    def __init__(self, account_key: str, config_path: str, cache_dir: str = ""):
+        """Read the file locations of account_key from the config.
+
+        Parameters
+        ----------
+        account_key : str
+            Key of the ledger and accounts files in config.json, E.g "main"
+        config_path : str
+            Path of config.json
+        cache_dir : str
+            Directory to persist the account index and parsed statements
+            in, see AccountIndex and StatementCache. Not persisted if ''
+        """
         with open(config_path, "r") as f:
             credentials = json.load(f)
         self._ledger_dir = credentials["ledger_dir"]
@@ -25,216 +370,285 @@ class Parser:
         self._accounts_file_path = (
             self._ledger_dir + credentials["accounts_files"][account_key]
         )
+        # Every ledger file of the config, whatever the account key
+        self._ledger_file_paths = list(
+            dict.fromkeys(
+                self._ledger_dir + path
+                for path in [credentials.get("main_ledger_file", "")]
+                + list(credentials["other_ledger_files"].values())
+                if path
+            )
+        )
         self.statements_dir = self._ledger_dir + "Statements/"
         self._backup_dir = self._ledger_dir + "Backups/"
+        # Number of backup snapshots kept of each file
+        self._backup_retention = credentials.get("backup_retention", 30)
+        self._cache_dir = cache_dir
+        self._account_index = None
+        # Maximum total size of the parsed statements kept in the cache
+        self._statement_cache_bytes = credentials.get("statement_cache_mb", 128) * 2**20
+        self._statement_cache = None
+        # Compiled now, so invalid rules are reported before any prompt
+        self._rules = RuleSet.from_config(credentials.get("rules", []))
+
+    @property
+    def ledger_file_path(self) -> str:
+        """Path of the ledger file transactions are written to."""
+        return self._ledger_file_path
+
+    @property
+    def ledger_file_paths(self) -> list[str]:
+        """Paths of all ledger files in the config, E.g to seed the history."""
+        return self._ledger_file_paths
+
+    @property
+    def accounts_file_path(self) -> str:
+        """Path of the accounts.ledger new accounts are declared in."""
+        return self._accounts_file_path
+
+    @property
+    def rules(self) -> RuleSet:
+        """Categorisation rules of the config, see RuleSet."""
+        return self._rules
+
+    @property
+    def statement_cache(self) -> StatementCache | None:
+        """Cache of parsed statements in {cache_dir}/statements, if cache_dir."""
+        if self._statement_cache is None and self._cache_dir:
+            from santan2ledger.statement_cache import StatementCache
+
+            self._statement_cache = StatementCache(
+                os.path.join(self._cache_dir, "statements"),
+                max_bytes=self._statement_cache_bytes,
+            )
+        return self._statement_cache
 
-    def _get_encoding(self, file_path: str) -> str:
+    @profiled("encoding")
+    def _get_encoding(
+        self, file_path: str, prefix_size: int = 65536, min_confidence: float = 0.8
+    ) -> str:
         """Return the encoding type of the input file.
 
-        Uses the chardet library to read in and determine the encoding of the
-        input file located at file_path.
+        Checks for a byte order mark, then tries decoding the file as utf-8
+        chunk by chunk. Only if that fails is chardet run, on the chunk that
+        failed, and on the whole file only if it is not confident about that
+        chunk. The detected encoding is only returned if it decodes the
+        whole file, else cp1252 or latin-1 is. The result is cached by path,
+        size and mtime, so an unchanged file is never sniffed twice.
 
         Parameters
         ----------
         file_path : str
             Path to file to determine encoding of.
+        prefix_size : int
+            Number of bytes read for the BOM check and each decoding chunk
+        min_confidence : float
+            Minimum chardet confidence to accept the detection of the chunk
+            utf-8 failed on
 
         Returns
         -------
         str
             Encoding type. E.g "utf-8"
         """
-        with open(file_path, "rb") as f:
-            encoding = chardet.detect(f.read())["encoding"]
+        stat = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if cache_key in self._encoding_cache:
+            return self._encoding_cache[cache_key]
 
+        with open(file_path, "rb") as f:
+            prefix = f.read(prefix_size)
+            encoding = next((enc for bom, enc in BOMS if prefix.startswith(bom)), "")
+            if not encoding:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                chunk = failed = prefix
+                try:
+                    while chunk:
+                        failed = chunk
+                        decoder.decode(chunk)
+                        chunk = f.read(prefix_size)
+                    decoder.decode(b"", final=True)
+                    encoding = "utf-8"
+                except UnicodeDecodeError:
+                    import chardet
+
+                    # Not the prefix, which may well be plain ASCII
+                    detected = chardet.detect(failed)
+                    if detected["confidence"] < min_confidence:
+                        f.seek(0)
+                        detector = chardet.UniversalDetector()
+                        for chunk in iter(lambda: f.read(prefix_size), b""):
+                            detector.feed(chunk)
+                            if detector.done:
+                                break
+                        detected = detector.close()
+                    encoding = _fallback_encoding(
+                        f, detected["encoding"], prefix_size
+                    )
+
+        self._encoding_cache[cache_key] = encoding
         return encoding
 
-    def _file_contents_to_str(self, file_path: str) -> str:
-        """Read file at file_path and return contents as a single string.
+    def iter_statement(
+        self, file_path: str, field_sep: str = ":"
+    ) -> Iterator[StatementRecord]:
+        """Lazily read the transactions in the .txt file found at file_path.
+
+        Text file with regular entries, separated by field_sep, E.g
+
+            Date: 09/08/2022
+            Description: CARD PAYMENT TO eBay
+            Amount: -182.42 GBP
+            Balance: 29.43 GBP
+
+        is read line by line, and a typed record is yielded for every
+        complete Date/Description/Amount/Balance block. Anything else, such
+        as the From:/Account: header, is skipped. Only the current block is
+        ever held in memory.
 
         Parameters
         ----------
         file_path : str
-            File path of file to read in
+            Path to the txt file
+        field_sep : str
+            key field_sep value. E.g ':'
 
-        Returns
-        -------
-        str
-            Contents of the file, encoded in utf-8
+        Yields
+        ------
+        StatementRecord
+            (date, description, amount, commodity, balance) of a transaction
         """
         with open(file_path, "r", encoding=self._get_encoding(file_path)) as f:
-            file_contents = f.read()
-        # Remove chars such as \xa0 from non utf-8 encoding
-        file_contents = unicodedata.normalize("NFKD", file_contents)
-        return file_contents
-
-    def _append_text_to_file(self, text: str, file_path: str) -> None:
-        """Append text str to file at file_path.
+            fields = {}
+            for line in f:
+                # Remove chars such as \xa0 from non utf-8 encoding, and tabs
+                line = unicodedata.normalize("NFKD", line).replace("\t", "")
+                line = line.rstrip("\r\n")
+                key, sep, val = line.partition(field_sep)
+                # A blank line or a repeated key marks the start of a new block
+                if not sep or key in fields:
+                    record = self._fields_to_record(fields)
+                    if record:
+                        yield record
+                    fields = {}
+                if sep:
+                    fields[key] = val
+
+            record = self._fields_to_record(fields)
+            if record:
+                yield record
+
+    def _fields_to_record(self, fields: dict[str, str]) -> StatementRecord | None:
+        """Convert the raw key: value fields of one block to a StatementRecord.
 
         Parameters
         ----------
-        text : str
-            String to add to end of file
-        file_path : str
-            File path of the file to write to
+        fields : dict[str, str]
+            E.g {"Date": " 09/08/2022", "Amount": " -182.42 GBP", ...}
+
+        Returns
+        -------
+        StatementRecord | None
+            None if fields is not a complete transaction block
         """
-        with open(file_path, "a") as f:
-            f.write(text + "\n")
+        try:
+            amount_commodity = fields["Amount"].split()
+            return StatementRecord(
+                date=datetime.strptime(fields["Date"].strip(), "%d/%m/%Y").date(),
+                # Keep the leading space, ledger entries are written as "date *desc"
+                description=fields["Description"],
+                amount=float(amount_commodity[0]),
+                commodity=amount_commodity[1] if len(amount_commodity) > 1 else "",
+                balance=float(fields["Balance"].split()[0]),
+            )
+        except KeyError:
+            return None
 
-    def txt_to_df(self, file_path: str, field_sep: str = ":") -> pd.DataFrame:
-        """Convert .txt file found at file_path to Pandas DataFrame and return result.
+    @profiled("parse_statement")
+    def read_table(self, file_path: str) -> StatementTable:
+        """Read the .txt file at file_path into a StatementTable.
 
-        Text file with regular entries, separated by field_sep, E.g
+        See iter_statement for the file format. If the file was read before,
+        its table is loaded from the statement_cache instead.
 
-            Date: 09/08/2022
-            Description: CARD PAYMENT TO eBay
-            Amount: -182.42
-            Balance: 29.43
+        Parameters
+        ----------
+        file_path : str
+            Path to the txt file
 
-        gets parsed and converted to a Pandas DataFrame with column names given
-        by the keys, and rows given by the values.
+        Returns
+        -------
+        StatementTable
+            Transactions in file order, i.e. newest first for Santander exports
+        """
+        cache = self.statement_cache
+        if cache is not None:
+            table = cache.get(file_path)
+            if table is not None:
+                return table
+        table = StatementTable.from_records(self.iter_statement(file_path=file_path))
+        if cache is not None:
+            cache.put(file_path, table)
+        return table
+
+    @profiled("parse_statement")
+    def read_statement(self, file_path: str) -> list[StatementRecord]:
+        """Return all records of the .txt file at file_path, see iter_statement.
 
         Parameters
         ----------
         file_path : str
             Path to the txt file
-        field_sep : str
-            key field_sep value. E.g ':'
 
         Returns
         -------
-        pd.DataFrame
-            Pandas DataFrame with columns given by the keys
+        list[StatementRecord]
+            Records in file order, i.e. newest first for Santander exports
         """
-        f_str = self._file_contents_to_str(file_path)
-        str_list = [
-            item.replace("\t", "")
-            for item in f_str.split("\n")
-            if item != "\t\t\t\t\t\t" and item
-        ]
-        str_list.remove("")  # Weird bug where a single '' doesn't get removed
-        key_val_list = [s.split(field_sep) for s in str_list]
-        keys = [key_val[0] for key_val in key_val_list]
-        df_dict = {key: [] for key in pd.Series(keys).unique()}
-        for key, val in key_val_list:
-            df_dict[key].append(val)
-
-        # Exclude unwanted key: vals, such as title: TITLE
-        max_list_len = max([len(val) for val in df_dict.values()])
-        keys_to_remove = []
-        for key in df_dict:
-            if len(df_dict[key]) != max_list_len:
-                keys_to_remove.append(key)
-
-        # Note: Can't do this in the above loop, because we get
-        # a: "Dictionary changed during runtime" error
-        for key in keys_to_remove:
-            df_dict.pop(key)
-
-        try:
-            df = pd.DataFrame.from_dict(df_dict)
-            # Split Amount and Balance cols into float values and str commodity separate cols
-            amount_commodity_df = (
-                df["Amount"].str.split(" ", expand=True).drop(0, axis=1)
+        return list(self.iter_statement(file_path=file_path))
+
+    def account_index(self) -> AccountIndex:
+        """Return the index of accounts.ledger, refreshed if the file changed."""
+        if self._account_index is None:
+            self._account_index = AccountIndex(
+                self._accounts_file_path,
+                cache_path=(
+                    os.path.join(self._cache_dir, "accounts_index.json")
+                    if self._cache_dir
+                    else ""
+                ),
+                get_encoding=self._get_encoding,
             )
-            df["Amount"] = amount_commodity_df[1].astype(float)
-            df["Commodity"] = amount_commodity_df[2].astype(str)
-            # Balance column
-            balance_commodity_df = (
-                df["Balance"].str.split(" ", expand=True).drop(0, axis=1)
-            )
-            df["Balance"] = balance_commodity_df[1].astype(float)
-            # Convert Date column to Pandas datetime series
-            df["Date"] = pd.to_datetime(df["Date"], format=" %d/%m/%Y")
-        except KeyError:
-            pass
-
-        return df
+        else:
+            self._account_index.refresh()
+        return self._account_index
 
+    @profiled("read_accounts")
     def get_account_list(self) -> list[str]:
-        """Read accounts.ledger and return list of account names.
+        """Return the account names declared in accounts.ledger.
+
+        Only "account" directives at the start of a line are read, see
+        AccountIndex, which only rescans what changed since the last call.
 
         Returns
         -------
         list[str]
-            List of account strings, E.g
+            List of account strings, in file order, E.g
             ["Expenses:Food", "Assets:Cash", ...]
         """
-        accounts_str = self._file_contents_to_str(self._accounts_file_path)
-        return [
-            s.replace("account ", "")
-            for s in re.findall(pattern="account.*", string=accounts_str)
-        ]
-
-    def append_xacts_to_ledger_file(self, xacts: list[Xact]) -> None:
-        """Format xacts as newline separated string and write to ledger file.
+        return self.account_index().all_names()
 
-        Parameters
-        ----------
-        xacts : list[Xact]
-            List of Xact objects to write to file.
-        """
-        xacts_str = "\n"
-        xacts_str += "\n\n".join([xact.to_ledger_str() for xact in xacts])
-        self._append_text_to_file(text=xacts_str, file_path=self._ledger_file_path)
+    @profiled("backup")
+    def make_backup(self) -> BackupStore:
+        """Snapshot the ledger and accounts files into the backup store.
 
-    def append_accounts_to_file(self, accounts: list[str]) -> None:
-        """Format accounts as a string and write to accounts.ledger.
+        Only versions not backed up before are stored, see BackupStore.
 
-        Parameters
-        ----------
-        accounts : list[str]
-            List of account names, E.g
-            ["Expenses:Food", "Assets:Cash", ...]
+        Returns
+        -------
+        BackupStore
+            The store, E.g to list or restore snapshots
         """
-        if accounts:
-            accounts_str = "account "
-            accounts_str += "\naccount ".join(accounts)
-            self._append_text_to_file(
-                text=accounts_str, file_path=self._accounts_file_path
-            )
-
-    def make_backup(self) -> None:
-        """Backup ledger and accounts files."""
-        if not os.path.exists(self._backup_dir):
-            os.mkdir(self._backup_dir)
-
-        shutil.copyfile(
-            self._ledger_file_path,
-            self._backup_dir + "ledger_file-" + str(date.today()) + ".BAK",
-        )
-        shutil.copyfile(
-            self._accounts_file_path,
-            self._backup_dir + "accounts_file-" + str(date.today()) + ".BAK",
-        )
-
-
-if __name__ == "__main__":
-    parser = Parser()
-    # txt_file = "Statements09012964141909.txt"
-    # print(txt_to_df(file_path=txt_file))
-    # print(parser._append_text_to_file(text="Hello darkness my old friend...",
-    #                                   file_path="/home/isaac/Documents/Track/Ledger/accounts.ledger"))
-
-    # test_accounts = parser.get_account_list()
-    # print(test_accounts)
-    # parser.append_accounts_to_file(accounts=test_accounts)
-
-    # test_xact_1 = Xact(
-    #     source_account="Assets:Santander:Spending",
-    #     target_account="Expenses:Spending:Food",
-    #     amount=-420.00,
-    #     description="CARD PAYMENT TO TFL TRAVEL CH,1.65 GBP, RATE 1.00/GBP ON 01-08-2022",
-    #     date_str="04/08/2022",
-    #     commodity="GBP",
-    # )
-    # test_xact_2 = Xact(
-    #     source_account="Assets:Santander:Main",
-    #     target_account="Expenses:TEST",
-    #     amount=10.00,
-    #     description="CARD PAYMENT TO TFL TRAVEL CH,1.65 GBP, RATE 1.00/GBP ON 01-08-2022",
-    #     date_str="05/07/2022",
-    #     commodity="GBP",
-    # )
-
-    # parser.append_xacts_to_ledger_file([test_xact_1, test_xact_2])
+        store = BackupStore(self._backup_dir, retention=self._backup_retention)
+        store.snapshot([self._ledger_file_path, self._accounts_file_path])
+        return store
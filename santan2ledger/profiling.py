@@ -0,0 +1,141 @@
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Returned by Profiler.stage while disabled, so timing costs nothing
+_NO_OP = nullcontext()
+
+
+class Profiler:
+
+    """Records wall time, call counts and memory peaks of named stages.
+
+    Disabled by default. Stages are recorded with the stage() context manager
+    or the profiled() decorator, single measurements with record().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._start = 0.0
+        # Stage name -> {"calls", "seconds", "peak_memory_bytes", "samples"}
+        self._stages = {}
+        # (stage name, start offset, duration) of every call, for the trace
+        self._events = []
+        # [peak memory so far] of every stage still running, outermost first
+        self._open = []
+
+    def enable(self) -> None:
+        """Start recording, and tracing memory allocations."""
+        self.enabled = True
+        self._start = time.perf_counter()
+        tracemalloc.start()
+
+    def disable(self) -> None:
+        """Stop recording."""
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, name: str):
+        """Return a context manager timing the enclosed block as stage name.
+
+        The memory peak is the highest traced memory while the block ran,
+        including memory allocated by enclosing stages, and by the stages
+        nested in it.
+        """
+        if not self.enabled:
+            return _NO_OP
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        # Resetting the peak forgets it for the running stages, so fold it in
+        _, peak = tracemalloc.get_traced_memory()
+        for running in self._open:
+            running[0] = max(running[0], peak)
+        tracemalloc.reset_peak()
+        entry = [0]
+        self._open.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            # Stages of other threads may end in any order
+            del self._open[next(i for i, e in enumerate(self._open) if e is entry)]
+            self._add(name, seconds, max(entry[0], peak))
+            self._events.append((name, start - self._start, seconds))
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record a single measurement, E.g the latency of one suggestion."""
+        if self.enabled:
+            self._add(name, seconds, 0)
+
+    def _add(self, name: str, seconds: float, peak: int) -> None:
+        stats = self._stages.setdefault(
+            name, {"calls": 0, "seconds": 0.0, "peak_memory_bytes": 0, "samples": []}
+        )
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["peak_memory_bytes"] = max(stats["peak_memory_bytes"], peak)
+        stats["samples"].append(seconds)
+
+    def summary(self) -> str:
+        """Return a table of all recorded stages, slowest total first."""
+        lines = [
+            f"{'stage':<28}{'calls':>7}{'total s':>10}{'mean ms':>10}"
+            f"{'p95 ms':>10}{'max ms':>10}{'peak MiB':>10}"
+        ]
+        for name, stats in sorted(
+            self._stages.items(), key=lambda item: -item[1]["seconds"]
+        ):
+            samples = sorted(stats["samples"])
+            p95 = samples[min(int(0.95 * len(samples)), len(samples) - 1)]
+            lines.append(
+                f"{name:<28}{stats['calls']:>7}{stats['seconds']:>10.3f}"
+                f"{1000 * stats['seconds'] / stats['calls']:>10.2f}"
+                f"{1000 * p95:>10.2f}{1000 * samples[-1]:>10.2f}"
+                f"{stats['peak_memory_bytes'] / 2**20:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the per stage totals and every recorded call as JSON."""
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "stages": {
+                        name: {k: v for k, v in stats.items() if k != "samples"}
+                        for name, stats in self._stages.items()
+                    },
+                    "events": [
+                        {"stage": name, "start": start, "seconds": seconds}
+                        for name, start, seconds in self._events
+                    ],
+                },
+                f,
+                indent=2,
+            )
+
+
+# Shared by the whole package, enabled by main's --profile flag
+profiler = Profiler()
+
+
+def profiled(name: str):
+    """Decorate a function so every call is recorded as stage name."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
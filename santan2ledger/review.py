@@ -0,0 +1,244 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Awaitable, Callable
+from prompt_toolkit.application import Application
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.enums import EditingMode
+from prompt_toolkit.formatted_text import ANSI
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout import Layout
+from prompt_toolkit.layout.containers import (
+    Float,
+    FloatContainer,
+    HSplit,
+    VSplit,
+    Window,
+)
+from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
+from prompt_toolkit.layout.menus import CompletionsMenu
+from prompt_toolkit.widgets import Frame
+from santan2ledger.profiling import profiler
+from santan2ledger.selector import Selector
+from santan2ledger.xact import Xact
+import santan2ledger.colors as colors
+
+# Number of previous transactions shown above the current one
+HISTORY_ROWS = 5
+
+PROMPT_STR = "└─────>> "
+
+
+class ReviewApp:
+
+    """Full-screen prompt for the target account of transaction after transaction.
+
+    A single prompt_toolkit Application runs for the whole review. Moving
+    to the next transaction updates the history pane, the transaction pane
+    and the input buffer in place and redraws them. The suggested account
+    is computed in a worker thread and shown as soon as it is ready.
+    """
+
+    def __init__(self, selector: Selector, **app_kwargs):
+        """Build the layout, nothing is shown until run.
+
+        Parameters
+        ----------
+        selector : Selector
+            Selector holding the history, suggesting and completing accounts
+        app_kwargs
+            Passed to Application, E.g input and output
+        """
+        self._selector = selector
+        self._xact = None
+        self._progress = ""
+        self._history_str = ""
+        # The suggestion of the current transaction, while being computed
+        self._suggestion_task = None
+        # Resolved with the text entered for the current transaction
+        self._answer = None
+        # When the current transaction was set, until it is first drawn
+        self._shown_at = None
+        self._buffer = Buffer(
+            completer=selector.account_completer,
+            complete_while_typing=True,
+            multiline=False,
+            accept_handler=self._accept,
+        )
+        body = HSplit(
+            [
+                Window(
+                    FormattedTextControl(lambda: ANSI(self._history_str)),
+                    height=HISTORY_ROWS + 1,
+                ),
+                Frame(
+                    Window(FormattedTextControl(self._xact_text), height=3),
+                    title=lambda: self._progress,
+                ),
+                Window(FormattedTextControl(self._suggestion_text), height=1),
+                VSplit(
+                    [
+                        Window(
+                            FormattedTextControl(PROMPT_STR),
+                            width=len(PROMPT_STR),
+                        ),
+                        Window(BufferControl(self._buffer), height=1),
+                    ]
+                ),
+                # Room for the completions menu
+                Window(),
+                Window(
+                    FormattedTextControl(self._bottom_toolbar),
+                    height=1,
+                    style="class:bottom-toolbar",
+                ),
+            ]
+        )
+        self._app = Application(
+            layout=Layout(
+                FloatContainer(
+                    body,
+                    floats=[
+                        Float(
+                            xcursor=True,
+                            ycursor=True,
+                            content=CompletionsMenu(max_height=12, scroll_offset=1),
+                        )
+                    ],
+                ),
+                focused_element=self._buffer,
+            ),
+            key_bindings=self._make_key_bindings(),
+            editing_mode=EditingMode.VI,
+            full_screen=True,
+            after_render=self._after_render,
+            **app_kwargs,
+        )
+
+    def _make_key_bindings(self) -> KeyBindings:
+        bindings = KeyBindings()
+
+        @bindings.add("f4")
+        def _(event):
+            """Toggle between Emacs and Vi mode."""
+            if event.app.editing_mode == EditingMode.VI:
+                event.app.editing_mode = EditingMode.EMACS
+            else:
+                event.app.editing_mode = EditingMode.VI
+
+        @bindings.add("c-y")
+        def _(event):
+            """Insert the suggested account."""
+            event.app.current_buffer.insert_text(self._suggestion())
+
+        @bindings.add("c-c")
+        def _(event):
+            """Stop the review, like Ctrl-C at a prompt."""
+            event.app.exit(exception=KeyboardInterrupt())
+
+        return bindings
+
+    def run(self, review: Callable[[ReviewApp], Awaitable[None]]) -> None:
+        """Show the application until the coroutine review(self) returns.
+
+        Parameters
+        ----------
+        review : Callable[[ReviewApp], Awaitable[None]]
+            Loop over the transactions, awaiting get_target_account for
+            each. Exceptions it raises, and KeyboardInterrupt on Ctrl-C,
+            propagate out of run
+        """
+        self._app.run(
+            pre_run=lambda: self._app.create_background_task(self._drive(review))
+        )
+
+    async def _drive(self, review: Callable[[ReviewApp], Awaitable[None]]) -> None:
+        try:
+            await review(self)
+        except Exception as e:
+            self._app.exit(exception=e)
+        else:
+            self._app.exit()
+
+    async def get_target_account(self, xact: Xact, progress: str) -> str:
+        """Show xact and return the target account entered for it.
+
+        Entering nothing accepts the suggested account, waiting for it if it
+        is still being computed.
+
+        Parameters
+        ----------
+        xact : Xact
+            Transaction to get the target account of
+        progress : str
+            Title of the transaction pane, E.g "Account No. 3 / 20"
+
+        Returns
+        -------
+        str
+            Target account, E.g "Expenses:Spending:Travel"
+        """
+        self._xact = xact
+        self._progress = progress
+        self._history_str = str(self._selector.prev_xact_tail(HISTORY_ROWS))
+        self._buffer.reset()
+        loop = asyncio.get_running_loop()
+        self._suggestion_task = loop.run_in_executor(
+            None, self._selector.suggest_account, xact
+        )
+        self._suggestion_task.add_done_callback(lambda _: self._app.invalidate())
+        self._answer = loop.create_future()
+        self._shown_at = time.perf_counter()
+        self._app.invalidate()
+        target_account = await self._answer
+        if not target_account:
+            # We can just hit <Enter> to select the suggestion
+            target_account = await self._suggestion_task
+        self._selector.record_target_account(target_account)
+        return target_account
+
+    def _accept(self, buffer: Buffer) -> bool:
+        if self._answer is not None and not self._answer.done():
+            self._answer.set_result(buffer.text)
+        return True
+
+    def _after_render(self, app: Application) -> None:
+        if self._shown_at is not None:
+            profiler.record("render", time.perf_counter() - self._shown_at)
+            self._shown_at = None
+
+    def _suggestion(self) -> str:
+        """Return the suggested account, '' while it is being computed."""
+        task = self._suggestion_task
+        if task is None or not task.done() or task.exception():
+            return ""
+        return task.result()
+
+    def _xact_text(self) -> ANSI:
+        xact = self._xact
+        if xact is None:
+            return ANSI("")
+        return ANSI(
+            colors.magenta(f"{xact.date_str}")
+            + " *"
+            + colors.white(f"{xact.description}\n")
+            + colors.gray("  [Unknown]")
+            + colors.magenta(f"          {-1 * xact.amount} {xact.commodity}\n")
+            + colors.cyan(f"  {xact.source_account}")
+        )
+
+    def _suggestion_text(self) -> ANSI:
+        if self._suggestion_task is not None and not self._suggestion_task.done():
+            return ANSI("┌───" + colors.gray("Finding similar transactions..."))
+        suggestion = self._suggestion()
+        if suggestion:
+            return ANSI(
+                "┌───" + colors.gray("[Unknown]") + " << " + colors.green(suggestion)
+            )
+        return ANSI("┌───" + colors.red("No similar transactions found!"))
+
+    def _bottom_toolbar(self) -> str:
+        mode = "Vi" if self._app.editing_mode == EditingMode.VI else "Emacs"
+        return (
+            f"{self._progress} Hit <Enter> to accept suggested match [F4] {mode} "
+        )
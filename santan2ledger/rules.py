@@ -0,0 +1,176 @@
+import re
+from typing import NamedTuple
+
+# Key of a trie node holding the indices of the rules whose substring ends there
+END = ""
+
+
+class Rule(NamedTuple):
+
+    """Assigns account to matching descriptions, within an amount range."""
+
+    account: str
+    # Substring searched for in the description, ignoring case
+    contains: str = ""
+    # Regular expression searched for in the description, ignoring case,
+    # if contains is ''. '' matches every description
+    regex: str = ""
+    # Inclusive bounds of the statement amount, None if unbounded
+    min_amount: float | None = None
+    max_amount: float | None = None
+
+    def accepts(self, amount: float | None) -> bool:
+        """Whether amount is in range, an unknown amount only if it is unbounded."""
+        if self.min_amount is None and self.max_amount is None:
+            return True
+        if amount is None:
+            return False
+        return (self.min_amount is None or amount >= self.min_amount) and (
+            self.max_amount is None or amount <= self.max_amount
+        )
+
+
+def _trie_regex(node: dict) -> str:
+    """Return a regex matching the strings of a trie, without capturing groups.
+
+    Alternatives share their common prefixes, so matching it at a position
+    only follows the branches of the characters actually there, however
+    many strings the trie holds.
+    """
+    parts = [
+        re.escape(char) + _trie_regex(child)
+        for char, child in sorted(node.items())
+        if char != END
+    ]
+    if not parts:
+        return ""
+    if len(parts) == 1 and END not in node:
+        return parts[0]
+    return "(?:" + "|".join(parts) + ")" + ("?" if END in node else "")
+
+
+class RuleSet:
+
+    """User defined categorisation rules, compiled into a single regex.
+
+    Each rule of config.json "rules" maps descriptions containing a
+    substring ("contains") or matching a regex ("regex"), and optionally
+    with an amount in ["min_amount", "max_amount"], to "account". Matching
+    ignores case. Amounts are as on the statement, negative for payments.
+    E.g
+        {"contains": "TFL TRAVEL", "account": "Expenses:Transport"}
+        {"regex": "SALARY FROM (ACME|INITECH)", "account": "Income:Salary"}
+        {"contains": "AMAZON", "max_amount": -100, "account": "Expenses:Tech"}
+
+    The substrings are compiled into a trie, and the trie and the regexes
+    into one lookahead regex, which finds every position where any rule may
+    match in a single pass over the description. The trie is only walked,
+    and the regexes only tried, at those positions. So substring rules
+    classify a description in time linear in its length, however many
+    there are. The first matching rule in the config wins. Regexes can't
+    use numbered backreferences, as their groups are renumbered when
+    combined.
+    """
+
+    def __init__(self, rules: list[Rule] = ()):
+        """Compile rules, raising ValueError naming any invalid regex.
+
+        Parameters
+        ----------
+        rules : list[Rule]
+            Rules in order of priority
+        """
+        self._rules = list(rules)
+        # Lowercased substring, one character per level, see END
+        self._trie = {}
+        # Index and compiled regex of the regex rules
+        self._regexes = []
+        for i, rule in enumerate(self._rules):
+            if rule.contains:
+                node = self._trie
+                for char in rule.contains.lower():
+                    node = node.setdefault(char, {})
+                node.setdefault(END, []).append(i)
+                continue
+            try:
+                self._regexes.append((i, re.compile(rule.regex, re.IGNORECASE)))
+            except re.error as e:
+                raise ValueError(f"Invalid regex of rule {i} ({rule.account}): {e}")
+        alternatives = []
+        if self._trie:
+            alternatives.append(_trie_regex(self._trie))
+        alternatives += [f"(?i:{regex.pattern})" for _, regex in self._regexes]
+        # Zero width, so every position is tried, and one rule can't consume
+        # text another rule would match
+        try:
+            self._candidates = re.compile(f"(?=(?:{'|'.join(alternatives)}))")
+        except re.error as e:
+            # E.g the same group name in two rules
+            raise ValueError(f"Rules can't be combined: {e}")
+
+    @classmethod
+    def from_config(cls, rules: list[dict]) -> "RuleSet":
+        """Build the rules of config.json "rules", see RuleSet.
+
+        Raises ValueError if a rule has no "account", or both "contains"
+        and "regex".
+        """
+        parsed = []
+        for i, rule in enumerate(rules):
+            if not rule.get("account"):
+                raise ValueError(f"Rule {i} has no account: {rule}")
+            if rule.get("contains") and rule.get("regex"):
+                raise ValueError(f"Rule {i} has both contains and regex: {rule}")
+            parsed.append(
+                Rule(
+                    account=rule["account"],
+                    contains=rule.get("contains", ""),
+                    regex=rule.get("regex", ""),
+                    min_amount=rule.get("min_amount"),
+                    max_amount=rule.get("max_amount"),
+                )
+            )
+        return cls(parsed)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def match(self, description: str, amount: float | None = None) -> str:
+        """Return the account of the first rule matching, '' if none does.
+
+        Parameters
+        ----------
+        description : str
+            Transaction description, E.g "CARD PAYMENT TO TFL TRAVEL CH,..."
+        amount : float | None
+            Statement amount. If None, only rules without an amount range
+            can match
+
+        Returns
+        -------
+        str
+            Account of the matching rule, E.g "Expenses:Transport"
+        """
+        if not self._rules:
+            return ""
+        rules = self._rules
+        text = description.lower()
+        best = len(rules)
+        for candidate in self._candidates.finditer(text):
+            start = candidate.start()
+            node = self._trie
+            for char in text[start:]:
+                node = node.get(char)
+                if node is None:
+                    break
+                for i in node.get(END, ()):
+                    if i < best and rules[i].accepts(amount):
+                        best = i
+            for i, regex in self._regexes:
+                if i >= best:
+                    break
+                if rules[i].accepts(amount) and regex.match(text, start):
+                    best = i
+            if best == 0:
+                break
+        return rules[best].account if best < len(rules) else ""
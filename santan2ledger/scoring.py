@@ -0,0 +1,114 @@
+from array import array
+
+
+class AccountStats:
+
+    """Running statistics of the transactions of one merchant to one account."""
+
+    __slots__ = ("amount_sum", "rows")
+
+    def __init__(self):
+        self.amount_sum = 0.0
+        # History positions of the transactions, oldest first
+        self.rows = array("I")
+
+    @property
+    def count(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: int, amount: float) -> None:
+        """Record a transaction at history position row."""
+        self.amount_sum += amount
+        self.rows.append(row)
+
+    def remove_last(self, amount: float) -> None:
+        """Forget the most recently recorded transaction."""
+        self.amount_sum -= amount
+        self.rows.pop()
+
+
+class Scorer:
+
+    """Combine description similarity with amount, frequency and recency.
+
+    Every component is scaled to [0, 1] and weighted, and the weighted sum
+    is scaled by fuzz.ratio. So the final score is never above the text
+    similarity, and an unrelated description scores near 0 however often
+    and recently its account was used.
+    """
+
+    def __init__(
+        self,
+        text_weight: float = 0.7,
+        amount_weight: float = 0.1,
+        frequency_weight: float = 0.15,
+        recency_weight: float = 0.05,
+        recency_half_life: int = 200,
+    ):
+        """Set the weights of the score components.
+
+        Parameters
+        ----------
+        text_weight : float
+            Weight of the fuzz.ratio between the descriptions
+        amount_weight : float
+            Weight of how close the amount is to the account's mean amount
+            for that merchant
+        frequency_weight : float
+            Weight of the share of the merchant's transactions that went to
+            the account
+        recency_weight : float
+            Weight of how recently the merchant was assigned to the account
+        recency_half_life : int
+            Number of history rows after which the recency component halves
+        """
+        self.text_weight = text_weight
+        self.amount_weight = amount_weight
+        self.frequency_weight = frequency_weight
+        self.recency_weight = recency_weight
+        self.recency_half_life = recency_half_life
+
+    def score(
+        self,
+        ratio: int,
+        stats: AccountStats,
+        merchant_count: int,
+        amount: float | None,
+        n_rows: int,
+    ) -> float:
+        """Return the 0-100 score of assigning a transaction to an account.
+
+        Parameters
+        ----------
+        ratio : int
+            fuzz.ratio between the transaction and the merchant description
+        stats : AccountStats
+            Statistics of the merchant's transactions to the account
+        merchant_count : int
+            Number of transactions of the merchant, to any account
+        amount : float | None
+            Amount of the transaction. If None, the amount component counts
+            as a perfect match.
+        n_rows : int
+            Number of rows in the history
+
+        Returns
+        -------
+        float
+            Weighted score, at most ratio
+        """
+        if amount is None:
+            amount_score = 1.0
+        else:
+            mean_amount = stats.amount_sum / stats.count
+            distance = abs(amount - mean_amount) / max(abs(mean_amount), 1)
+            amount_score = 1 / (1 + distance)
+        frequency_score = stats.count / merchant_count
+        age = n_rows - 1 - stats.rows[-1]
+        recency_score = 0.5 ** (age / self.recency_half_life)
+        return ratio * (
+            self.text_weight
+            + self.amount_weight * amount_score
+            + self.frequency_weight * frequency_score
+            + self.recency_weight * recency_score
+        )
@@ -1,65 +1,239 @@
-import re
-import pandas as pd
+from __future__ import annotations
 import os
-from fuzzywuzzy import fuzz  # fuzz.ratio(s1, s2)
-from prompt_toolkit.completion import FuzzyWordCompleter
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from prompt_toolkit.completion import Completer, FuzzyWordCompleter
 from prompt_toolkit.shortcuts import prompt
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.enums import EditingMode
-from prompt_toolkit.formatted_text import ANSI
 from prompt_toolkit.application.current import get_app
-from prompt_toolkit.shortcuts import print_container
-from prompt_toolkit.layout.controls import FormattedTextControl
-from prompt_toolkit.layout.containers import Window
-from prompt_toolkit.widgets import Frame
+from santan2ledger.completer import AccountCompleter
+from santan2ledger.history import HistoryStore, HistoryTable, SqliteHistoryStore
+from santan2ledger.journal import IGNORED_ACCOUNTS
+from santan2ledger.profiling import profiled, profiler
+from santan2ledger.rules import RuleSet
 from santan2ledger.xact import Xact
-import santan2ledger.colors as colors
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class Selector:
 
     """Account selector object."""
 
-    def __init__(self, data_dir: str = "data"):
-        """Initialize selector attributes and create previous transaction df.
-
-        Checks if {data_dir}/prev_xact.pkl exists, and if not create it
+    def __init__(
+        self,
+        data_dir: str = "data",
+        prefetch_size: int = 8,
+        store: HistoryStore | None = None,
+        ledger_file_paths: list[str] | None = None,
+        rules: RuleSet | None = None,
+    ):
+        """Initialize selector attributes and open the previous transaction store.
+
+        Unless another store is given, the history is kept in an SQLite
+        database at {data_dir}/prev_xact.db, migrated once from
+        {data_dir}/prev_xact.pkl if that exists. The history itself is only
+        loaded when first needed, usually by filter_source_account, after
+        the transactions of ledger_file_paths are brought up to date.
 
         Parameters
         ----------
         data_dir : str
-            The directory to store the .pkl file
-            E.g for "data" => pickle file is located at "data/prev_xact.pkl"
+            The directory to store the history database
+            E.g for "data" => database is located at "data/prev_xact.db"
+        prefetch_size : int
+            Number of upcoming descriptions scored per background prefetch job
+        store : HistoryStore | None
+            Backend holding the previous transactions
+        ledger_file_paths : list[str] | None
+            Ledger files whose transactions also seed the history, E.g
+            Parser.ledger_file_paths
+        rules : RuleSet | None
+            Rules categorising transactions before any history matching,
+            E.g Parser.rules
         """
         self._data_dir = data_dir
-        self._prev_xact_df_path = data_dir + "/prev_xact.pkl"
-        if not os.path.exists(self._prev_xact_df_path):
-            pd.DataFrame(
-                columns=[
-                    "date_str",
-                    "description",
-                    "source_account",
-                    "target_account",
-                    "amount",
-                    "commodity",
-                ]
-            ).to_pickle(self._prev_xact_df_path)
-        self.prev_xact_df = pd.read_pickle(self._prev_xact_df_path)
+        if store is None:
+            store = SqliteHistoryStore(
+                path=data_dir + "/prev_xact.db",
+                pickle_path=data_dir + "/prev_xact.pkl",
+            )
+        self._store = store
+        self._ledger_file_paths = ledger_file_paths or []
+        self._synced_ledgers = False
+        self._rules = RuleSet() if rules is None else rules
+        # History loaded from the store plus the rows accepted since, in
+        # compact columns, so accepting or undoing a row is an append or pop
+        self._history = None
+        # The index is shared with the prefetch worker, so guard it with a lock
+        self._index_lock = threading.Lock()
+        self._index = None
         self.new_accounts = set()
+        # Completes accounts for every prompt of the session, most used first
+        self.account_completer = AccountCompleter()
+        self._counted_history = False
+        self._prefetch_size = prefetch_size
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        # Key bindings are shared by all prompts, see autocomplete_prompt
+        self._prompt_default = ""
+        self._toolbar_str = ""
+        self._bindings = self._make_key_bindings()
+
+    @property
+    def prev_xact_df(self) -> pd.DataFrame:
+        """All previous transactions, including those accepted this session.
+
+        Builds a new DataFrame and requires pandas, so prefer
+        prev_xact_tail for display.
+        """
+        self._ensure_history()
+        return self._history.to_df()
+
+    def prev_xact_tail(self, n: int = 5) -> HistoryTable:
+        """Return the last n previous transactions, printable as a table."""
+        self._ensure_history()
+        return self._history.tail(n)
+
+    def _ensure_history(self) -> None:
+        """Load the whole history, unless a (filtered) history is loaded."""
+        if self._history is None:
+            self._load_history()
+
+    @profiled("load_history")
+    def _load_history(self, source_account: str = "") -> None:
+        """Load the history, only of source_account if given, and index it."""
+        if not self._synced_ledgers:
+            self._synced_ledgers = True
+            with profiler.stage("sync_ledgers"):
+                for file_path in self._ledger_file_paths:
+                    if os.path.exists(file_path):
+                        self._store.sync_ledger(file_path)
+        self._history = self._store.load(source_account)
+        self._build_index()
+        if not self._counted_history:
+            # Rank the accounts used most in the history first when completing
+            self._counted_history = True
+            counts = {}
+            for account in self._history.column("target_account"):
+                counts[account] = counts.get(account, 0) + 1
+            for account, count in counts.items():
+                if account not in IGNORED_ACCOUNTS:
+                    self.account_completer.trie.insert(account, count)
+
+    def _build_index(self) -> None:
+        """(Re)build the description matching index from self._history."""
+        # Imported here as fuzzywuzzy is slow to import
+        from santan2ledger.index import DescriptionIndex
+
+        with self._index_lock:
+            self._index = DescriptionIndex(
+                descriptions=self._history.column("description"),
+                target_accounts=self._history.column("target_account"),
+                amounts=self._history.column("amount"),
+            )
+
+    def _precompute(
+        self, descriptions: list[str], amounts: list[float] | None = None
+    ) -> list[tuple[str, int]]:
+        """Run DescriptionIndex.precompute while holding the index lock."""
+        with self._index_lock:
+            return self._index.precompute(descriptions, amounts)
+
+    def prefetch_suggestions(self, descriptions: list[str]) -> None:
+        """Score descriptions against the history in a background thread.
+
+        The descriptions are queued in order, prefetch_size at a time, so the
+        next few transactions are always ready first. Results land in the
+        index cache, which append_xact_to_prev_df and pop_last_xact keep up
+        to date, so _get_matching_account_name becomes a lookup.
+
+        Parameters
+        ----------
+        descriptions : list[str]
+            Descriptions of the upcoming transactions, in display order
+        """
+        self._ensure_history()
+        # Descriptions a rule applies to whatever the amount need no scoring
+        descriptions = [
+            description
+            for description in descriptions
+            if not self._rules.match(description)
+        ]
+        for start in range(0, len(descriptions), self._prefetch_size):
+            self._prefetcher.submit(
+                self._precompute, descriptions[start : start + self._prefetch_size]
+            )
+
+    def close(self) -> None:
+        """Stop the prefetch thread and close the history store.
+
+        History changes not saved with update_prev_xact_file are discarded.
+        """
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self._store.close()
+
+    def filter_source_account(self, source_account: str) -> None:
+        """Restrict self.prev_xact_df and the matching index to source_account.
+
+        Parameters
+        ----------
+        source_account : str
+            Account the transactions come from, E.g
+            "Assets:Santander:Spending"
+        """
+        self._load_history(source_account)
+
+    def add_accounts(self, accounts: list[str]) -> None:
+        """Offer accounts for completion, E.g Parser.get_account_list()."""
+        for account in accounts:
+            self.account_completer.trie.insert(account)
+
+    def _make_key_bindings(self) -> KeyBindings:
+        """Return the key bindings of autocomplete_prompt."""
+        bindings = KeyBindings()
 
+        @bindings.add("f4")
+        def _(event):
+            """Toggle between Emacs and Vi mode."""
+            if event.app.editing_mode == EditingMode.VI:
+                event.app.editing_mode = EditingMode.EMACS
+            else:
+                event.app.editing_mode = EditingMode.VI
+
+        @bindings.add("c-y")
+        def _(event):
+            """Insert default value."""
+            event.app.current_buffer.insert_text(self._prompt_default)
+
+        return bindings
+
+    def _bottom_toolbar(self) -> str:
+        """Display the current input mode."""
+        if get_app().editing_mode == EditingMode.VI:
+            return f"{self._toolbar_str} [F4] Vi "
+        else:
+            return f"{self._toolbar_str} [F4] Emacs "
+
+    @profiled("prompt")
     def autocomplete_prompt(
         self,
-        items: list[str],
+        items: list[str] | set[str] = (),
         default: str = "",
         message: str = "> ",
         toolbar_str: str = "",
+        completer: Completer | None = None,
     ) -> str:
         """Prompt for input with fuzzy autocompletion and vi-mode.
 
         Parameters
         ----------
-        items : list[str]
-            List of strings to use for fuzzy completion suggestions
+        items : list[str] | set[str]
+            Strings to use for fuzzy completion suggestions, if no completer
+            is given
         default : str
             Default value to suggest. If <Enter> is hit, i.e
             an empty string is entered, then the default value
@@ -68,43 +242,26 @@ class Selector:
             Prompt message to display on the RHS of the prompt line
         toolbar_str : str
             String to display in the bottom toolbar
+        completer : Completer | None
+            Completer to use instead of items, E.g self.account_completer
 
         Returns
         -------
         str
             User entered input
         """
-
-        bindings = KeyBindings()
-        items_completer = FuzzyWordCompleter(items)
-
-        def bottom_toolbar():
-            """Display the current input mode."""
-            if get_app().editing_mode == EditingMode.VI:
-                return f"{toolbar_str} [F4] Vi "
-            else:
-                return f"{toolbar_str} [F4] Emacs "
-
-        @bindings.add("f4")
-        def _(event):
-            """Toggle between Emacs and Vi mode."""
-            if event.app.editing_mode == EditingMode.VI:
-                event.app.editing_mode = EditingMode.EMACS
-            else:
-                event.app.editing_mode = EditingMode.VI
-
-        @bindings.add("c-y")
-        def _(event):
-            """Insert default value."""
-            event.app.current_buffer.insert_text(default)
+        if completer is None:
+            completer = FuzzyWordCompleter(list(items))
+        self._prompt_default = default
+        self._toolbar_str = toolbar_str
 
         selected = prompt(
             message=message,
-            completer=items_completer,
+            completer=completer,
             complete_while_typing=True,
             # default=default,
-            key_bindings=bindings,
-            bottom_toolbar=bottom_toolbar,
+            key_bindings=self._bindings,
+            bottom_toolbar=self._bottom_toolbar,
             vi_mode=True,
         )
 
@@ -113,44 +270,31 @@ class Selector:
         else:
             return selected
 
-    def _clean_text(self, text: str, extra_to_remove: list[str] = []) -> str:
-        """Simplify the text and return cleaned string.
-
-        Remove all non-alpha chars also all strings
-        from extra_to_remove and lowercase
-
-        Parameters
-        ----------
-        text : str
-            Text to clean
-        extra_to_remove : list[str]
-            List of extra words to remove from text
-
-        Returns
-        -------
-        str
-            Cleaned string
-        """
-        text = re.sub(r"[^a-zA-Z\s]", "", text.lower())
-        text = re.sub(r"(gbp|card|payment|samsung|on)", r"", text)
-        return text
-
+    @profiled("match")
     def _get_matching_account_name(
-        self, desc_to_match: str, min_ratio: int = 10
+        self, desc_to_match: str, amount: float | None = None, min_score: int = 10
     ) -> str:
-        """Get the account name of the closest matching prev transaction.
+        """Get the best account name for a transaction from prev transactions.
 
-        Calculates fuzz.ratio(account_to_match, s) for all s
-        in self.prev_xact_df["description"] and return account name from
-        row with max ratio
+        If one of the rules matches the transaction, its account is returned
+        without looking at the history. Otherwise the accounts of the
+        previous transactions with the most similar (cleaned) descriptions
+        are ranked by DescriptionIndex.best_match, which combines
+        description similarity with amount proximity, how often and how
+        recently the account was used for that description.
 
-        If self.prev_xact_df is empty, or there isn't a match with fuzz.ratio
-        above min_ratio, return '', empty string
+        If self.prev_xact_df is empty, or there isn't a match with a score
+        above min_score, return '', empty string
 
         Parameters
         ----------
         desc_to_match : str
             Transaction description string to find matches with from the df
+        amount : float | None
+            Transaction amount, if known
+        min_score : int
+            Matches with a score (0-100) below this are not suggested. The
+            score never exceeds the text similarity, see Scorer
 
         Returns
         -------
@@ -160,109 +304,162 @@ class Selector:
             If no sufficient matches found, or df is empty,
             return empty string, ''
         """
-        if self.prev_xact_df.empty:
+        account = self._rules.match(desc_to_match, amount)
+        if account:
+            return account
+        self._ensure_history()
+        with self._index_lock:
+            account, score = self._index.best_match(desc_to_match, amount)
+        if score < min_score:
             return ""
         else:
-            df = self.prev_xact_df.copy()
-            df["fuzz_ratio"] = df["description"].apply(
-                lambda desc: fuzz.ratio(
-                    self._clean_text(desc),
-                    self._clean_text(desc_to_match),
-                )
-            )
-            df.sort_values(by=["fuzz_ratio"], ascending=False, inplace=True)
-            max_fuzz_ratio = df["fuzz_ratio"].head(1).item()
-            # TODO: Add weighting for more frequency
-            if max_fuzz_ratio < min_ratio:
-                return ""
-            else:
-                return df["target_account"].head(1).item()
+            return account
 
-    def append_xact_to_prev_df(self, xact: Xact) -> None:
-        """Append xact to self.prev_xact_df.
+    @profiled("precompute")
+    def precompute_suggestions(
+        self,
+        descriptions: list[str],
+        amounts: list[float] | None = None,
+        min_score: int = 10,
+    ) -> list[tuple[str, int]]:
+        """Match a whole statement against the history in one batch.
+
+        Descriptions matched by a rule get its account with a score of 100,
+        only the others are matched against the history. Subsequent calls
+        to _get_matching_account_name for these descriptions read the
+        precomputed (and incrementally maintained) matches.
 
         Parameters
         ----------
-        xact : Xact
-            Transaction object, whose attributes are used as values in the dict
-            which gets appended to self.prev_xact_df
+        descriptions : list[str]
+            Transaction descriptions, E.g statement_df["Description"]
+        amounts : list[float] | None
+            Transaction amounts, E.g statement_df["Amount"]
+        min_score : int
+            Matches with a score (0-100) below this are not suggested. The
+            score never exceeds the text similarity, see Scorer
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            (suggested account, score) for each description. The account
+            is '' if there is no sufficient match.
         """
-        xact_dict = {
-            "source_account": [xact.source_account],
-            "target_account": [xact.target_account],
-            "amount": [xact.amount],
-            "description": [xact.description],
-            "date_str": [xact.date_str],
-            "commodity": [xact.commodity],
-        }
-        self.prev_xact_df = pd.concat([self.prev_xact_df, pd.DataFrame(xact_dict)])
+        if amounts is None:
+            amounts = [None] * len(descriptions)
+        suggestions = [
+            (self._rules.match(description, amount), 100)
+            for description, amount in zip(descriptions, amounts)
+        ]
+        unmatched = [i for i, (account, _) in enumerate(suggestions) if not account]
+        if unmatched:
+            self._ensure_history()
+            matches = self._precompute(
+                [descriptions[i] for i in unmatched], [amounts[i] for i in unmatched]
+            )
+            for i, (account, score) in zip(unmatched, matches):
+                suggestions[i] = (account if score >= min_score else "", score)
+        return suggestions
 
-    def update_prev_xact_file(self) -> None:
-        """Export current self.prev_xact_df to pickle file."""
-        self.prev_xact_df.to_pickle(self._prev_xact_df_path)
+    def imported_xacts(self, source_account: str) -> tuple[set[str], str]:
+        """Return the fingerprints and legacy last date of imported transactions.
 
-    def get_target_account(
-        self, xact: Xact, prev_account_list: list[str], progress: str
-    ) -> str:
+        See HistoryStore.imported.
         """
-        Prompt user for target account.
+        return self._store.imported(source_account)
+
+    def restore_xacts(self, xacts: list[tuple[Xact, str]]) -> int:
+        """Add recovered transactions missing from the history and commit them.
 
-        Suggest smart suggestions using xact description matching.
-        Also once target account is selected, updates new_accounts set
-        with target_account.
+        Transactions are recognised as present by their fingerprint.
 
         Parameters
         ----------
-        xact : Xact
-            Transaction to get target account of
-        prev_account_list : list[str]
-            List of accounts to use for fuzzy autocompletion
-        progress : str
-            String passed from main loop, giving indication of
-            how many accounts have been processed
+        xacts : list[tuple[Xact, str]]
+            (transaction, statement fingerprint) pairs, E.g from
+            SessionJournal.recover
 
         Returns
         -------
-        str
-            Target account string. E.g
-                "Expenses:Spending:Travel"
+        int
+            Number of transactions added
         """
-        account_list = list(set(prev_account_list).union(self.new_accounts))
-        desc_to_match = xact.description
-        match = self._get_matching_account_name(desc_to_match)
-        xact.target_account = "[Unknown]"
-        pretty_ledger_string = ANSI(
-            colors.magenta(f"{xact.date_str}")
-            + " *"
-            + colors.white(f"{xact.description}\n")
-            + colors.gray(f"  {xact.target_account}")
-            + colors.magenta(f"          {-1 * xact.amount} {xact.commodity}\n")
-            + colors.cyan(f"  {xact.source_account}")
-        )
-        print_container(
-            Frame(
-                Window(
-                    FormattedTextControl(pretty_ledger_string),
-                    # style="bg:#88ff88 #000000",
-                ),
-                title=progress,
-            ),
-        )
-        if match:
-            print("┌───" + colors.gray("[Unknown]") + " << " + colors.green(match))
-        else:
-            print("┌───" + colors.red("No similar transactions found!"))
+        n_added = 0
+        imported = {}
+        for xact, fingerprint in xacts:
+            if xact.source_account not in imported:
+                imported[xact.source_account] = self.imported_xacts(
+                    xact.source_account
+                )[0]
+            if fingerprint and fingerprint in imported[xact.source_account]:
+                continue
+            if self._history is None:
+                # Loaded with the rest of the history when first needed
+                self._store.append(xact, fingerprint)
+            else:
+                self.append_xact_to_prev_df(xact, fingerprint)
+            n_added += 1
+        self.update_prev_xact_file()
+        return n_added
 
-        target_account = self.autocomplete_prompt(
-            items=account_list,
-            default=match,
-            toolbar_str=progress + " Hit <Enter> to accept suggested match ",
-            message="└─────>> ",
-        )
-        # Update new accounts set
-        self.new_accounts = self.new_accounts.union({target_account})
+    def append_xact_to_prev_df(self, xact: Xact, fingerprint: str = "") -> None:
+        """Append xact to self.prev_xact_df.
+
+        Parameters
+        ----------
+        xact : Xact
+            Transaction object, whose attributes are used as values in the dict
+            which gets appended to self.prev_xact_df
+        fingerprint : str
+            Fingerprint of the statement row xact came from, so it is
+            recognised as imported on the next run
+        """
+        self._ensure_history()
+        self._history.append(xact)
+        self._store.append(xact, fingerprint)
+        # Not taken back by pop_last_xact, the ranking only needs to be rough
+        if xact.target_account not in IGNORED_ACCOUNTS:
+            self.account_completer.trie.insert(xact.target_account, 1)
+        # Cached suggestions are updated in place against the new row
+        with self._index_lock:
+            self._index.append(xact.description, xact.target_account, xact.amount)
+
+    def pop_last_xact(self) -> None:
+        """Remove the last row of self.prev_xact_df, e.g to undo a selection."""
+        self._ensure_history()
+        self._history.pop()
+        self._store.pop()
+        with self._index_lock:
+            stale = self._index.pop()
+        # Suggestions that pointed at the removed row are recomputed in the background
+        if stale:
+            self._prefetcher.submit(self._rescore, stale)
+
+    def _rescore(self, cleaned_queries: list[str]) -> None:
+        """Run DescriptionIndex.rescore while holding the index lock."""
+        with self._index_lock:
+            self._index.rescore(cleaned_queries)
+
+    @profiled("commit_history")
+    def update_prev_xact_file(self) -> None:
+        """Commit the transactions added this session to the history store."""
+        self._store.commit()
+
+    def suggest_account(self, xact: Xact) -> str:
+        """Return the suggested target account of xact, '' if there is none.
 
-        return target_account
+        Thread safe, E.g ReviewApp calls it from a worker thread.
+        """
+        start = time.perf_counter()
+        match = self._get_matching_account_name(xact.description, xact.amount)
+        profiler.record("suggestion_latency", time.perf_counter() - start)
+        return match
+
+    def record_target_account(self, target_account: str) -> None:
+        """Complete target_account from now on, and add it to new_accounts."""
+        if target_account not in IGNORED_ACCOUNTS:
+            self.account_completer.trie.insert(target_account)
+        self.new_accounts.add(target_account)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import json
+import mmap
+import os
+import threading
+import time
+from santan2ledger.files import hash_file, write_atomic
+from santan2ledger.parser import PARSER_VERSION, StatementTable
+
+
+class StatementCache:
+
+    """Statements already parsed, keyed by file content and parser version.
+
+    Each statement is stored in cache_dir as StatementTable.to_bytes, under
+    the sha256 of the file it was read from and PARSER_VERSION, and loaded
+    back as views of a memory map. {cache_dir}/index.json remembers the
+    (size, mtime) and hash of every file seen, so an unchanged file is
+    recognised without reading it, and when each entry was last used. A hit
+    only notes the time in memory, it is saved by the next put(), so reads
+    never write the index. The least recently used entries are evicted once
+    they take more than max_bytes.
+
+    Caches sharing cache_dir may be used from several threads, E.g by the
+    parsers of --all-accounts, the index is re-read before every change.
+    """
+
+    # Guards the read, change, write of index.json of every cache
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str, max_bytes: int = 128 * 2**20):
+        """Open (or create) the cache in cache_dir.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory of the cache, E.g "data/statements"
+        max_bytes : int
+            Maximum total size of the cached statements
+        """
+        self._cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # "files": path -> [size, mtime_ns, sha256]
+        # "entries": entry name -> {"bytes": size, "used": last use time}
+        self._index = {"files": {}, "entries": {}}
+        # Entry name -> last use by get(), not saved yet
+        self._used = {}
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r") as f:
+                self._index = json.load(f)
+
+    def _save_index(self) -> None:
+        write_atomic(self._index_path, json.dumps(self._index).encode())
+
+    def _entry_path(self, name: str) -> str:
+        return os.path.join(self._cache_dir, name + ".stmt")
+
+    def _entry_name(self, file_path: str) -> tuple[str, bool]:
+        """Return the entry name of the current content of file_path.
+
+        The file is only hashed if its size or mtime changed since it was
+        last seen, the second value is whether it was.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        known = self._index["files"].get(file_path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return f"{known[2]}-v{PARSER_VERSION}", False
+        digest, _ = hash_file(file_path)
+        self._index["files"][file_path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return f"{digest}-v{PARSER_VERSION}", True
+
+    def get(self, file_path: str) -> StatementTable | None:
+        """Return the cached statement of file_path, None if it isn't cached.
+
+        The columns of the table are views of the memory mapped entry, which
+        stays mapped while they are in use.
+        """
+        with self._lock:
+            self._load_index()
+            name, changed = self._entry_name(file_path)
+            entry = self._index["entries"].get(name)
+            table = None
+            if entry is not None and os.path.exists(self._entry_path(name)):
+                with open(self._entry_path(name), "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                table = StatementTable.from_bytes(data)
+            if table is None:
+                changed = self._index["entries"].pop(name, None) or changed
+            else:
+                self._used[name] = time.time()
+            # Only what a later get() would otherwise have to redo is saved
+            if changed:
+                self._save_index()
+        return table
+
+    def put(self, file_path: str, table: StatementTable) -> None:
+        """Cache table as the parsed statement of file_path.
+
+        Entries not used for the longest time are evicted until all fit in
+        max_bytes. A table larger than max_bytes on its own isn't cached.
+        """
+        data = table.to_bytes()
+        if len(data) > self._max_bytes:
+            return None
+        with self._lock:
+            self._load_index()
+            name, _ = self._entry_name(file_path)
+            write_atomic(self._entry_path(name), data)
+            entries = self._index["entries"]
+            for used_name, used in self._used.items():
+                if used_name in entries:
+                    entries[used_name]["used"] = max(entries[used_name]["used"], used)
+            self._used = {}
+            entries[name] = {"bytes": len(data), "used": time.time()}
+            total = sum(entry["bytes"] for entry in entries.values())
+            for evicted in sorted(entries, key=lambda name: entries[name]["used"]):
+                if total <= self._max_bytes:
+                    break
+                total -= entries.pop(evicted)["bytes"]
+                if os.path.exists(self._entry_path(evicted)):
+                    os.remove(self._entry_path(evicted))
+            # Forget files whose statements are no longer cached
+            self._index["files"] = {
+                path: known
+                for path, known in self._index["files"].items()
+                if f"{known[2]}-v{PARSER_VERSION}" in entries
+            }
+            self._save_index()
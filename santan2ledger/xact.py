@@ -2,6 +2,16 @@ class Xact:
 
     """Transaction object."""
 
+    # No per-instance __dict__, one Xact is created for every statement row
+    __slots__ = (
+        "source_account",
+        "target_account",
+        "amount",
+        "description",
+        "date_str",
+        "commodity",
+    )
+
     def __init__(
         self,
         source_account: str,
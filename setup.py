@@ -6,8 +6,18 @@ setup(
     scripts=["santan2ledger/main.py"],
     entry_points={
         "console_scripts": [
-            "s2l = santan2ledger:main",
+            "s2l = santan2ledger.cli:main",
+            "s2l-backup = santan2ledger.backup:main",
         ],
     },
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
+    install_requires=[
+        "chardet",
+        "fuzzywuzzy",
+        "python-Levenshtein",
+        "prompt_toolkit",
+    ],
+    # Only needed for DataFrame exports, and to read a legacy prev_xact.pkl
+    extras_require={"pandas": ["pandas"]},
+    python_requires=">=3.10",
 )
@@ -0,0 +1,46 @@
+from santan2ledger.accounts import AccountIndex
+
+
+def test_partial_last_line_is_completed(tmp_path):
+    file_path = tmp_path / "accounts.ledger"
+    cache_path = str(tmp_path / "accounts_index.json")
+    file_path.write_text("account A\naccount Expenses:Fo")
+    index = AccountIndex(str(file_path), cache_path=cache_path)
+    assert index.names == ["A"]
+    assert index.all_names() == ["A", "Expenses:Fo"]
+
+    with open(file_path, "a") as f:
+        f.write("od  ; note\naccount B\n")
+    index.refresh()
+
+    assert index.names == ["A", "Expenses:Food", "B"]
+    assert index.all_names() == ["A", "Expenses:Food", "B"]
+    assert "Expenses:Fo" not in index.accounts
+    # Nor is it persisted
+    assert AccountIndex(str(file_path), cache_path=cache_path).all_names() == [
+        "A",
+        "Expenses:Food",
+        "B",
+    ]
+
+
+def test_partial_last_line_survives_the_cache(tmp_path):
+    file_path = tmp_path / "accounts.ledger"
+    cache_path = str(tmp_path / "accounts_index.json")
+    file_path.write_text("account A\naccount B")
+    AccountIndex(str(file_path), cache_path=cache_path)
+
+    assert AccountIndex(str(file_path), cache_path=cache_path).all_names() == [
+        "A",
+        "B",
+    ]
+
+
+def test_rewritten_file_is_rescanned(tmp_path):
+    file_path = tmp_path / "accounts.ledger"
+    file_path.write_text("account A\naccount B\n")
+    index = AccountIndex(str(file_path))
+    file_path.write_text("account C\n")
+    index.refresh()
+
+    assert index.all_names() == ["C"]
@@ -0,0 +1,83 @@
+import os
+from santan2ledger.backup import BackupStore
+
+
+def object_kinds(store_dir) -> list[str]:
+    return sorted(name.split(".")[1] for name in os.listdir(store_dir / "objects"))
+
+
+def make_accounts(tmp_path) -> dict[str, list[str]]:
+    """Ledger and accounts files of two accounts, E.g of --all-accounts."""
+    files = {}
+    for key in ("main", "spending"):
+        ledger_path = tmp_path / f"{key}.ledger"
+        accounts_path = tmp_path / f"{key}_accounts.ledger"
+        ledger_path.write_text(f"; {key}\n")
+        accounts_path.write_text("account Expenses:Food\n")
+        files[key] = [str(ledger_path), str(accounts_path)]
+    return files
+
+
+def append(file_path: str, text: str) -> None:
+    with open(file_path, "a") as f:
+        f.write(text)
+
+
+def test_snapshot_only_stores_changes(tmp_path):
+    files = make_accounts(tmp_path)
+    store = BackupStore(str(tmp_path / "Backups"))
+
+    first = store.snapshot(files["main"])
+    assert store.snapshot(files["main"]) is None
+    append(files["main"][0], "\n2022-08-01 SHOP\n")
+    second = store.snapshot(files["main"])
+
+    assert [snapshot["id"] for snapshot in store.snapshots()] == [1, 2]
+    ledger_path = os.path.abspath(files["main"][0])
+    assert second["files"][ledger_path]["chain"] == 1
+    # The unchanged accounts file reuses its version
+    accounts_path = os.path.abspath(files["main"][1])
+    assert second["files"][accounts_path] == first["files"][accounts_path]
+    assert object_kinds(tmp_path / "Backups") == ["delta", "z", "z"]
+    assert store.read(second["files"][ledger_path]["hash"]) == (
+        b"; main\n\n2022-08-01 SHOP\n"
+    )
+
+
+def test_prune_keeps_other_accounts_backups(tmp_path):
+    files = make_accounts(tmp_path)
+    store = BackupStore(str(tmp_path / "Backups"), retention=2)
+
+    spending = store.snapshot(files["spending"])
+    for i in range(4):
+        append(files["main"][0], f"\n2022-08-0{i + 1} SHOP {i}\n")
+        store.snapshot(files["main"])
+
+    ids = [snapshot["id"] for snapshot in store.snapshots()]
+    # Only the two newest snapshots of the main files are kept
+    assert ids == [spending["id"], 4, 5]
+    restored = store.restore(spending["id"], target_dir=str(tmp_path / "restored"))
+    assert sorted(os.path.basename(path) for path in restored) == [
+        "spending.ledger",
+        "spending_accounts.ledger",
+    ]
+    assert (tmp_path / "restored" / "spending.ledger").read_text() == "; spending\n"
+
+
+def test_restore_in_place(tmp_path):
+    files = make_accounts(tmp_path)
+    store = BackupStore(str(tmp_path / "Backups"), retention=2)
+    ledger_path = files["main"][0]
+    append(ledger_path, "\n2022-08-01 SHOP\n")
+    snapshot = store.snapshot(files["main"])
+    store.snapshot(files["spending"])
+    append(ledger_path, "\n2022-08-02 MISTAKE\n")
+
+    store.restore(snapshot["id"])
+
+    with open(ledger_path, "r") as f:
+        assert f.read() == "; main\n\n2022-08-01 SHOP\n"
+    # The overwritten version was backed up first, as a delta
+    latest = store.snapshots()[-1]["files"][os.path.abspath(ledger_path)]
+    assert latest["chain"] == 1
+    assert store.read(latest["hash"]).endswith(b"MISTAKE\n")
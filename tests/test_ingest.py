@@ -0,0 +1,32 @@
+from datetime import date
+from santan2ledger.ingest import merge_statements
+from santan2ledger.parser import StatementRecord
+
+
+def record(day: int, description: str, balance: float) -> StatementRecord:
+    return StatementRecord(date(2022, 8, day), description, -1.0, "GBP", balance)
+
+
+def test_same_day_rows_keep_statement_order():
+    # Newest first, as exported. Both exports overlap on the 2nd
+    first = [record(2, "B", 7.0), record(2, "A", 8.0), record(1, "START", 9.0)]
+    second = [
+        record(3, "E", 4.0),
+        record(2, "D", 5.0),
+        record(2, "C", 6.0),
+        record(2, "B", 7.0),
+        record(2, "A", 8.0),
+    ]
+
+    merged = merge_statements([first, second])
+
+    assert [r.description for r in merged] == ["START", "A", "B", "C", "D", "E"]
+
+
+def test_same_day_rows_are_not_interleaved():
+    first = [record(2, "A2", 1.0), record(2, "A1", 2.0)]
+    second = [record(2, "B2", 3.0), record(2, "B1", 4.0)]
+
+    merged = merge_statements([first, second])
+
+    assert [r.description for r in merged] == ["A1", "A2", "B1", "B2"]
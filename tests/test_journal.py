@@ -0,0 +1,92 @@
+from santan2ledger.journal import SessionJournal
+from santan2ledger.xact import Xact
+
+
+def make_xact(i: int, target_account: str) -> Xact:
+    return Xact(
+        source_account="Assets:Santander:Spending",
+        target_account=target_account,
+        amount=-float(i),
+        description=f"CARD PAYMENT TO SHOP {i}",
+        date_str=f"2022-08-0{i}",
+        commodity="GBP",
+    )
+
+
+def ledger_text(*xacts: Xact) -> str:
+    return "".join("\n" + xact.to_ledger_str() + "\n" for xact in xacts)
+
+
+def begin(tmp_path, flush_every: int = 2) -> SessionJournal:
+    ledger_path = tmp_path / "main.ledger"
+    accounts_path = tmp_path / "accounts.ledger"
+    ledger_path.write_text("; existing\n")
+    accounts_path.write_text("account Expenses:Food\n")
+    journal = SessionJournal(str(tmp_path / "session.journal"), flush_every)
+    journal.begin(str(ledger_path), str(accounts_path), ["Expenses:Food"])
+    return journal
+
+
+def crash(journal: SessionJournal) -> None:
+    """Stop writing the journal without ending the session."""
+    journal._file.close()
+
+
+def test_recover_after_undo_into_flushed_rows(tmp_path):
+    journal = begin(tmp_path)
+    xacts = [
+        make_xact(1, "Expenses:Food"),
+        make_xact(2, "Expenses:Travel"),
+        make_xact(3, "Expenses:Fun"),
+    ]
+    for xact in xacts:
+        journal.add(xact, fingerprint=str(xact.amount))
+    # The first two were flushed, undo the third and the flushed second
+    journal.pop()
+    journal.pop()
+    last = make_xact(4, "Expenses:Rent")
+    journal.add(last, fingerprint="last")
+    crash(journal)
+    assert (tmp_path / "main.ledger").read_text() == "; existing\n" + ledger_text(
+        *xacts[:2]
+    )
+
+    recovered = SessionJournal(str(tmp_path / "session.journal")).recover()
+
+    assert [(xact.description, fingerprint) for xact, fingerprint in recovered] == [
+        (xacts[0].description, "-1.0"),
+        (last.description, "last"),
+    ]
+    assert (tmp_path / "main.ledger").read_text() == "; existing\n" + ledger_text(
+        xacts[0], last
+    )
+    assert (tmp_path / "accounts.ledger").read_text() == (
+        "account Expenses:Food\naccount Expenses:Rent\n"
+    )
+    assert not (tmp_path / "session.journal").exists()
+
+
+def test_recover_ignores_torn_last_line(tmp_path):
+    journal = begin(tmp_path, flush_every=0)
+    xacts = [make_xact(1, "Expenses:Food"), make_xact(2, "Expenses:Travel")]
+    for xact in xacts:
+        journal.add(xact)
+    crash(journal)
+    with open(tmp_path / "session.journal", "a") as f:
+        f.write('{"op": "add", "xact": {"source_acc')
+
+    recovered = SessionJournal(str(tmp_path / "session.journal")).recover()
+
+    assert [xact.description for xact, _ in recovered] == [
+        xact.description for xact in xacts
+    ]
+    assert (tmp_path / "main.ledger").read_text() == "; existing\n" + ledger_text(
+        *xacts
+    )
+    assert (tmp_path / "accounts.ledger").read_text() == (
+        "account Expenses:Food\naccount Expenses:Travel\n"
+    )
+
+
+def test_recover_without_journal(tmp_path):
+    assert SessionJournal(str(tmp_path / "session.journal")).recover() == []
@@ -0,0 +1,20 @@
+from santan2ledger.profiling import Profiler
+
+
+def test_nested_stage_keeps_enclosing_peak():
+    profiler = Profiler()
+    profiler.enable()
+    try:
+        with profiler.stage("outer"):
+            data = bytearray(8 * 2**20)
+            del data
+            with profiler.stage("inner"):
+                small = bytearray(2**10)
+            del small
+    finally:
+        profiler.disable()
+
+    stages = profiler._stages
+    assert stages["outer"]["peak_memory_bytes"] >= 8 * 2**20
+    assert stages["inner"]["peak_memory_bytes"] < 8 * 2**20
+    assert profiler._open == []
@@ -0,0 +1,88 @@
+import os
+from datetime import date
+from santan2ledger.parser import StatementRecord, StatementTable
+from santan2ledger.statement_cache import StatementCache
+
+
+def round_trip(table: StatementTable) -> StatementTable:
+    data = table.to_bytes()
+    # Columns are 8 byte aligned, for use in place from a memory map
+    assert (data.index(b"\n") + 1) % 8 == 0
+    return StatementTable.from_bytes(memoryview(data))
+
+
+def test_round_trip_empty():
+    table = round_trip(StatementTable())
+
+    assert len(table) == 0
+    assert list(table) == []
+    assert table.descriptions == []
+
+
+def test_round_trip_one_row():
+    record = StatementRecord(
+        date=date(2022, 8, 4),
+        description="CARD PAYMENT TO CAFÉ £, RATE 1.00/GBP",
+        amount=-20.79,
+        commodity="GBP",
+        balance=1234.5,
+    )
+    table = StatementTable.from_records([record])
+
+    loaded = round_trip(table)
+
+    assert list(loaded) == [record]
+    assert loaded.fingerprint(0) == record.fingerprint
+
+
+def test_round_trip_empty_description():
+    record = StatementRecord(date(2022, 8, 4), "", 1.0, "", 0.0)
+
+    assert list(round_trip(StatementTable.from_records([record]))) == [record]
+
+
+def test_cache_recognises_unchanged_file(tmp_path):
+    statement_path = tmp_path / "Statements.txt"
+    statement_path.write_text("statement")
+    table = StatementTable.from_records(
+        [StatementRecord(date(2022, 8, 4), "SHOP", -1.5, "GBP", 10.0)]
+    )
+    cache = StatementCache(str(tmp_path / "statements"))
+
+    assert cache.get(str(statement_path)) is None
+    cache.put(str(statement_path), table)
+
+    reopened = StatementCache(str(tmp_path / "statements"))
+    assert list(reopened.get(str(statement_path))) == list(table)
+    statement_path.write_text("changed statement")
+    assert reopened.get(str(statement_path)) is None
+
+
+def test_loaded_table_is_a_view(tmp_path):
+    records = [
+        StatementRecord(date(2022, 8, 4), "SHOP", -1.5, "GBP", 10.0),
+        StatementRecord(date(2022, 8, 5), "CAFE", -2.5, "CHF", 7.5),
+    ]
+    loaded = round_trip(StatementTable.from_records(records))
+
+    assert isinstance(loaded.amounts, memoryview)
+    assert list(loaded.take([1, 0])) == records[::-1]
+    assert list(round_trip(loaded)) == records
+
+
+def test_cache_hit_does_not_write_the_index(tmp_path):
+    statement_path = tmp_path / "Statements.txt"
+    statement_path.write_text("statement")
+    table = StatementTable.from_records(
+        [StatementRecord(date(2022, 8, 4), "SHOP", -1.5, "GBP", 10.0)]
+    )
+    cache = StatementCache(str(tmp_path / "statements"))
+    cache.put(str(statement_path), table)
+    index_path = tmp_path / "statements" / "index.json"
+    saved = index_path.read_bytes()
+    os.utime(index_path, ns=(0, 0))
+
+    assert list(cache.get(str(statement_path))) == list(table)
+
+    assert index_path.stat().st_mtime_ns == 0
+    assert index_path.read_bytes() == saved